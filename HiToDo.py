@@ -18,17 +18,17 @@
 # along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import division
-from gi.repository import Gtk, Gdk, Pango
+from gi.repository import Gtk, Gdk, GLib, GObject, Pango
 from datetime import datetime, timedelta
-from xml.etree.ElementTree import ParseError
-from tarfile import ReadError
-from os import linesep
 from os.path import basename, dirname, splitext
 from urlparse import urlparse
 from urllib import unquote
 from math import floor
+from time import time
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from threading import Thread
 import xml.etree.ElementTree as et
-import operator
 from cgi import escape
 import sys
 import re
@@ -39,6 +39,9 @@ import settings
 import tools
 import widgets
 import undobuffer
+import taskfilter
+import labels
+import searchindex
 
 UI_XML = """
 <ui>
@@ -69,6 +72,10 @@ UI_XML = """
             <menuitem action='sel_none' />
             <menuitem action='sel_inv' />
             <separator />
+            <menuitem action='find' />
+            <menuitem action='find_next' />
+            <menuitem action='find_prev' />
+            <separator />
             <menu action='LabelMenu'>
                 <menuitem action='edit_assigners' />
                 <menuitem action='edit_assignees' />
@@ -81,6 +88,9 @@ UI_XML = """
             <menuitem action='expand_all' />
             <menuitem action='collapse_all' />
             <separator />
+            <menuitem action='filter_tasks' />
+            <menuitem action='clear_filter' />
+            <separator />
             <menuitem action='swap_focus' />
             <menuitem action='pick_cols' />
         </menu>
@@ -132,6 +142,10 @@ UI_XML = """
 # Define the gui and its actions.
 class HiToDo(Gtk.Window):
     PROGRAM_VERSION = "0.9.5"
+    BULK_VIEW_LIMIT = 200 #bulk edits touching more leaf tasks than this detach the task view
+    CHANGE_MERGE_TIME = 2.0 #seconds within which edits to one field share an undo entry
+    RENDER_CACHE_SIZE = 4096 #formatted values kept by date_render and work_render
+    SEARCH_SORT_LIMIT = 1000 #searches with more hits than this walk the tree to the next hit
 
     def track_focus(self, widget, event=None):
         '''Updates internal focus tracking reference
@@ -195,13 +209,18 @@ class HiToDo(Gtk.Window):
             self.defaults[14],      #notes
             parent[15],             #use due time (inherit from parent)
             self.defaults[16],      #inverted done
-            self.defaults[17]       #spent tracked
+            self.defaults[17],      #spent tracked
+            self.defaults[18],      #leaf tasks
+            self.defaults[19],      #done leaf tasks
+            self.__new_row_id(),    #row id
+            self.defaults[21]       #shown while filtered
         ]
 
         if self.seliter is not None and parent_iter is not self.seliter:
             new_row_iter = self.tasklist.insert_after(None, self.seliter, row_data)
         else:
             new_row_iter = self.tasklist.prepend(parent_iter, row_data)
+        self.row_ids[row_data[20]] = new_row_iter
 
         path = self.tasklist.get_path(new_row_iter)
         spath = path.to_string()
@@ -211,17 +230,14 @@ class HiToDo(Gtk.Window):
         self.calc_parent_pct(spath)
 
         #push add action to undo list
-        if parent_iter is not None:
-            ppath = self.tasklist.get_path(parent_iter)
-        else:
-            ppath = None
-        selpath = self.sellist[0] if self.seliter is not None else None
-        self.__push_undoable("add", (spath, ppath, selpath))
+        parent_id = self.tasklist[parent_iter][20] if parent_iter is not None else None
+        sibling_id = self.tasklist[self.seliter][20] if self.seliter is not None else None
+        self.__push_undoable("add", (row_data[20], parent_id, sibling_id))
 
         #select new row and immediately edit title field
-        self.tasklist_filter.convert_child_iter_to_iter(new_row_iter)
+        path = self.__list_to_view(path)
         self.selection.unselect_all()
-        self.selection.select_iter(new_row_iter)
+        self.selection.select_path(path)
         if parent_iter is not None:
             self.task_view.expand_to_path(path)
         self.task_view.set_cursor_on_cell(path, self.col_title, self.title_cell, True)
@@ -270,7 +286,7 @@ class HiToDo(Gtk.Window):
     def commit_work(self, widget=None, path=None, new_work=-1.0, work_type=''):
         '''Change a task's work time.
 
-        Once our value is committed, we iterate up our parents, updating their values to account for ours.
+        Once our value is committed, the difference is added to each of our parents with rollup().
 
         Keyword args:
         widget -- Gtk.Widget, optional, default None -- The calling widget. When populated, an undo entry will be pushed after execution.
@@ -293,21 +309,17 @@ class HiToDo(Gtk.Window):
             self._derive_work(path, work_type)
             return
 
-        old_work = self.tasklist[path][work_col] #store for later
-        out = floor(new_work * 3600) #convert to seconds
-        self.tasklist[path][work_col] = int(out) #save
+        treeiter = self.tasklist.get_iter(path)
+        old_work = self.tasklist[treeiter][work_col] #store for later
+        out = int(floor(new_work * 3600)) #convert to seconds
+        self.tasklist[treeiter][work_col] = out #save
 
-        #now we need to adjust our parent's total
-        parts = str(path).rpartition(':')
-        parent_path = parts[0] #find parent path
-        if parent_path != "":
-            parent_work = self.tasklist[parent_path][work_col]
-            pwork = (parent_work + out - old_work)/3600 #calculate new parent work
-            self.commit_work(path=parent_path, new_work=pwork, work_type=work_type) #commit up the chain
+        #now we need to adjust our parents' totals
+        self.rollup(treeiter, {work_col: out - old_work})
 
-        # Push undoable only on user click, not internal call. Very important since we recurse.
+        # Push undoable only on user click, not internal call.
         if widget is not None:
-            self.__push_undoable(work_type, (path, old_work, int(out)))
+            self.__push_undoable(work_type, (self.tasklist[treeiter][20], old_work, out))
 
     def _derive_work(self, path=None, work_type=''):
         '''Calculates task work time based on children
@@ -334,7 +346,88 @@ class HiToDo(Gtk.Window):
         self.commit_work(path = path, new_work = total_work/3600, work_type=work_type) #save it
 
         #push undoable. We have to push our own because commit_work only pushes when called from the UI.
-        self.__push_undoable(work_type, (path, old_work, total_work))
+        self.__push_undoable(work_type, (self.tasklist[treeiter][20], old_work, total_work))
+
+    def rollup(self, treeiter, deltas):
+        '''Applies changes in work time to every ancestor of treeiter
+
+        Each ancestor gets the same delta, so the cost is one write per level
+        instead of a re-sum of every child. Between begin_rollup() and
+        end_rollup(), deltas are only collected.
+
+        Arguments:
+        treeiter - Gtk.TreeIter - The row whose work time changed
+        deltas - dict - Maps work columns (see self.work_cols) to a change in seconds
+        '''
+        parent_iter = self.tasklist.iter_parent(treeiter)
+        if parent_iter is None: return
+
+        if self.rollup_batch is not None:
+            path = tuple(self.tasklist.get_path(parent_iter).get_indices())
+            self.__queue_rollup(self.rollup_batch, path, parent_iter, deltas)
+            return
+
+        while parent_iter is not None:
+            self.__add_work(parent_iter, deltas)
+            parent_iter = self.tasklist.iter_parent(parent_iter)
+
+    def begin_rollup(self):
+        '''Starts collecting work time changes instead of applying them
+
+        Used for bulk actions like paste, delete, and their undo. The tree must
+        not change shape until end_rollup() is called, since pending changes
+        are grouped by path.
+        '''
+        self.rollup_batch = {}
+
+    def end_rollup(self):
+        '''Applies every work time change collected since begin_rollup()
+
+        Pending changes are merged per row and applied deepest-first, so every
+        affected ancestor is written exactly once.
+        '''
+        pending = self.rollup_batch
+        self.rollup_batch = None
+        while pending:
+            deepest = max(len(path) for path in pending)
+            for path in [p for p in pending if len(p) == deepest]:
+                treeiter, deltas = pending.pop(path)
+                self.__add_work(treeiter, deltas)
+                parent_iter = self.tasklist.iter_parent(treeiter)
+                if parent_iter is not None:
+                    self.__queue_rollup(pending, path[:-1], parent_iter, deltas)
+
+    def __queue_rollup(self, pending, path, treeiter, deltas):
+        '''Merges deltas into the pending changes for the row at path'''
+
+        if path in pending:
+            queued = pending[path][1]
+            for col, delta in deltas.items():
+                queued[col] = queued.get(col, 0) + delta
+        else:
+            pending[path] = (treeiter, dict(deltas))
+
+    def __add_work(self, treeiter, deltas):
+        '''Adds each delta to the matching work column of treeiter'''
+
+        row = self.tasklist[treeiter]
+        self.update_row(treeiter, dict((col, row[col] + delta) for col, delta in deltas.items() if delta))
+
+    def update_row(self, treeiter, values):
+        '''Writes several columns of a single row at once
+
+        Assigning columns one by one emits row-changed for each of them, and
+        every assignment goes through the bindings on its own. This does it
+        with one call and one signal.
+
+        Arguments:
+        treeiter - Gtk.TreeIter - The row to change
+        values - dict - Maps column numbers to their new values
+        '''
+        if not values: return
+
+        cols = values.keys()
+        self.tasklist.set(treeiter, cols, [values[col] for col in cols])
 
     def duration_edit_start(self, renderer, editor, path, col=0):
         '''Set up time estimate editing field.
@@ -381,7 +474,7 @@ class HiToDo(Gtk.Window):
             title = self.tasklist[trackiter][13]
             self.tasklist[trackiter][17] = True
             action.set_tooltip("Stop tracking time toward '%s'" % title)
-            self.__push_undoable('track_spent', (self.tasklist.get_path(trackiter)))
+            self.__push_undoable('track_spent', (self.tasklist[trackiter][20],))
         else:
             # only track if we have an iter to track on
             if self.tracking is not None:
@@ -410,37 +503,48 @@ class HiToDo(Gtk.Window):
 
         When moving to Not Done, various other things happen:
         1. Our parent(s) are forced to the Not Done state using force_parent_not_done()
-        3. Our own pct complete is recalculated with calc_pct()
+        3. Our own pct complete is recalculated from our leaf counters
 
-        Finally, our parent's percent complete is always recalculated with calc_parent_pct()
+        Finally, the change in done leaf tasks is passed up to our parents with
+        __count_leaves(), which also updates their pct complete.
         '''
         if path is None: return
 
-        done = not new_done if new_done is not None else self.tasklist[path][12]
-
-        if not done:
-            #we're transitioning from not-done to done
-            self.tasklist[path][1] = 100 #no need to calculate; we're 100% complete
-
-            child_iter = self.tasklist.iter_children(self.tasklist.get_iter(path))
-            forced = self.__force_peers_done(child_iter)
-            self.tasklist[path][7] = datetime.now()
-            if self.tasklist[path][17]:
-                self.track_action.set_active(False)
-        else:
-            #we're transitioning from done to not-done
-            forced = self.force_parent_not_done(path)
-            self.calc_pct(path)
-
-        self.tasklist[path][12] = not done
-        self.tasklist[path][16] = done
-
-        #add undo action only on user click
-        if renderer is not None:
-            self.__push_undoable("done", (path, done, not done, forced))
+        treeiter = self.tasklist.get_iter(path)
+        done = not new_done if new_done is not None else self.tasklist[treeiter][12]
+        old_done_leaves = self.tasklist[treeiter][19]
 
-        #recalculate our parent's pct complete, if we have one
-        self.calc_parent_pct(path)
+        #a whole subtree may change at once, so the view only hears about it at the end
+        with self.bulk_edit(detach=self.tasklist[treeiter][18] > self.BULK_VIEW_LIMIT):
+            if not done:
+                #we're transitioning from not-done to done
+                child_iter = self.tasklist.iter_children(treeiter)
+                forced = self.__force_peers_done(child_iter)
+                if self.tasklist[treeiter][17]:
+                    self.track_action.set_active(False)
+                self.update_row(treeiter, {
+                    1: 100, #no need to calculate; we're 100% complete
+                    7: datetime.now(),
+                    12: True,
+                    16: False,
+                    19: self.tasklist[treeiter][18]
+                })
+            else:
+                #we're transitioning from done to not-done
+                forced = self.force_parent_not_done(path)
+                self.update_row(treeiter, {
+                    1: self.__own_pct(treeiter),
+                    12: False,
+                    16: True,
+                    19: self.tasklist[treeiter][19] if self.tasklist.iter_has_child(treeiter) else 0
+                })
+
+            #add undo action only on user click
+            if renderer is not None:
+                self.__push_undoable("done", (self.tasklist[treeiter][20], done, not done, forced))
+
+            #pass our change in done leaves on to our parents
+            self.__count_leaves(treeiter, 0, self.tasklist[treeiter][19] - old_done_leaves)
 
     def __force_peers_done(self, treeiter):
         '''Recursively marks all tasks on this level as Done
@@ -451,28 +555,26 @@ class HiToDo(Gtk.Window):
         3. Completed timestamp is set to datetime.now() unless it's already been set.
         4. The Done flag and its sister are set
 
-        Returns a list of paths which were forced to be done
+        Returns a list of row ids which were forced to be done
         '''
 
         forced = []
         while treeiter != None:
             if self.tasklist[treeiter][12] == False:
-                forced.append(self.tasklist.get_path(treeiter))
+                forced.append(self.tasklist[treeiter][20])
 
             #handle tracking
             if self.tasklist[treeiter][17]:
                 self.track_action.set_active(False)
 
-            #set pct complete
-            self.tasklist[treeiter][1] = 100
+            #set pct complete, done and anti-done flags, and mark every leaf below us done
+            values = {1: 100, 12: True, 16: False, 19: self.tasklist[treeiter][18]}
 
             #set complete timestamp if not already present
             if self.tasklist[treeiter][7] == "":
-                self.tasklist[treeiter][7] = datetime.now()
+                values[7] = datetime.now()
 
-            #set done and anti-done flags
-            self.tasklist[treeiter][12] = True
-            self.tasklist[treeiter][16] = False
+            self.update_row(treeiter, values)
 
             #recurse if necessary
             if self.tasklist.iter_has_child(treeiter):
@@ -495,44 +597,114 @@ class HiToDo(Gtk.Window):
             newpath = oldpath + parent_path
             parent_iter = self.tasklist.get_iter(newpath)
             if self.tasklist[parent_iter][12]:
-                forced.append(newpath)
-            self.tasklist[parent_iter][12] = False
-            self.tasklist[parent_iter][16] = True
+                forced.append(self.tasklist[parent_iter][20])
+            self.update_row(parent_iter, {12: False, 16: True})
             oldpath = newpath + ':'
         return forced
 
     def calc_parent_pct(self, path):
-        '''Calculates the pct complete of the direct parent of path.'''
+        '''Recounts the leaf tasks of the direct parent of path
 
+        Meant to be called after rows are added or removed. The parent's cached
+        leaf counters are summed from its children and any change is passed
+        up the tree with __count_leaves(), which keeps every ancestor's pct
+        complete current.
+        '''
         if not isinstance(path, basestring):
             path = path.to_string()
-        parts = path.partition(':')
-        parent_path = parts[0]
-        if parent_path == path: return
+        parent_path = path.rpartition(':')[0]
+        if parent_path == '': return
 
-        parent_iter = self.tasklist.get_iter(parent_path)
-        self.__do_pct(parent_iter)
+        self.__recount_leaves(self.tasklist.get_iter(parent_path))
 
     def calc_pct(self, path):
         '''Calculates the pct complete of the task at path
 
-        Mostly a wrapper function for __do_pct, as that requires an iter.
+        Branches use their cached leaf counters. Leaves are reset to zero.
         '''
         treeiter = self.tasklist.get_iter(path)
-        if self.tasklist.iter_n_children(treeiter) == 0:
-            self.tasklist[treeiter][1] = 0
-            return
+        self.tasklist[treeiter][1] = self.__own_pct(treeiter)
+
+    def __own_pct(self, treeiter):
+        '''Returns the pct complete calc_pct() would give the row at treeiter'''
+
+        if not self.tasklist.iter_has_child(treeiter):
+            return 0
+
+        row = self.tasklist[treeiter]
+        return self.__leaf_pct(row[18], row[19])
+
+    def __leaf_pct(self, n_leaves, n_done):
+        '''Returns the pct complete for a branch with the given leaf counts'''
+
+        if n_leaves == 0:
+            return 0
+        return int((n_done / n_leaves) * 100)
+
+    def __count_leaves(self, treeiter, d_leaves, d_done):
+        '''Adds to the cached leaf counters of every ancestor of treeiter
+
+        The pct complete of each ancestor is updated along the way, so any
+        change to the tree costs O(depth) instead of a recount.
+
+        Arguments:
+        treeiter - Gtk.TreeIter - The row whose counters changed
+        d_leaves - int - Change in the number of leaf tasks
+        d_done - int - Change in the number of done leaf tasks
+        '''
+        if not d_leaves and not d_done: return
+
+        parent_iter = self.tasklist.iter_parent(treeiter)
+        while parent_iter is not None:
+            row = self.tasklist[parent_iter]
+            n_leaves = row[18] + d_leaves
+            n_done = row[19] + d_done
+            self.update_row(parent_iter, {1: self.__leaf_pct(n_leaves, n_done), 18: n_leaves, 19: n_done})
+            parent_iter = self.tasklist.iter_parent(parent_iter)
 
-        self.__do_pct(treeiter)
+    def __recount_leaves(self, treeiter):
+        '''Sums the leaf counters of treeiter's children into its own
+
+        A row without children counts as a single leaf. Any change is then
+        passed up the tree with __count_leaves().
+        '''
+        row = self.tasklist[treeiter]
+        if self.tasklist.iter_has_child(treeiter):
+            n_leaves = 0
+            n_done = 0
+            child_iter = self.tasklist.iter_children(treeiter)
+            while child_iter is not None:
+                n_leaves += self.tasklist[child_iter][18]
+                n_done += self.tasklist[child_iter][19]
+                child_iter = self.tasklist.iter_next(child_iter)
+            pct = self.__leaf_pct(n_leaves, n_done)
+        else:
+            n_leaves = 1
+            n_done = int(row[12])
+            pct = 100 if row[12] else 0
+
+        d_leaves = n_leaves - row[18]
+        d_done = n_done - row[19]
+        self.update_row(treeiter, {1: pct, 18: n_leaves, 19: n_done})
+        self.__count_leaves(treeiter, d_leaves, d_done)
 
     def __do_pct(self, treeiter):
-        '''Calculates the pct complete of the row at 'treeiter'
+        '''Recounts the pct complete of the row at 'treeiter' from scratch
 
         Iterates through all levels of children, tallying the number marked Done
         against the total number found. Both tallies ignore children with
         children of their own (branches), since branches just summarize the pct
         complete of their own children.
+
+        The cached leaf counters of every row in the subtree are rewritten on
+        the way. Normal edits keep them current on their own, so this is only
+        needed after forcing a whole subtree at once, or as a consistency check.
         '''
+        if not self.tasklist.iter_has_child(treeiter):
+            leaf_done = int(self.tasklist[treeiter][12])
+            self.update_row(treeiter, {18: 1, 19: leaf_done})
+            return 1, leaf_done
+
         n_children = 0 # This is not the liststore's child count. It omits children who have children of their own.
         n_done = 0 # Also omits children who have children.
         child_iter = self.tasklist.iter_children(treeiter)
@@ -544,14 +716,13 @@ class HiToDo(Gtk.Window):
                 n_done += nd
             else:
                 #for leaves, inc counters as appropriate
+                leaf_done = int(self.tasklist[child_iter][12])
+                self.update_row(child_iter, {18: 1, 19: leaf_done})
                 n_children += 1
-                n_done += self.tasklist[child_iter][12]
+                n_done += leaf_done
             child_iter = self.tasklist.iter_next(child_iter)
 
-        if n_children is 0:
-            self.tasklist[treeiter][1] = 0
-        else:
-            self.tasklist[treeiter][1] = int((n_done / n_children) * 100)
+        self.update_row(treeiter, {1: self.__leaf_pct(n_children, n_done), 18: n_children, 19: n_done})
         return n_children, n_done
 
     def commit_priority(self, widget=None, path=None, new_priority=None):
@@ -564,7 +735,7 @@ class HiToDo(Gtk.Window):
         #priorities have to be integers
         if new_priority.isdigit():
             self.tasklist[path][0] = int(new_priority)
-            self.__push_undoable("change", (path, 0, old_val, int(new_priority)))
+            self.__push_change(path, 0, old_val, int(new_priority))
 
     def commit_date(self, widget=None, path=None, new_date=None, field=None):
         '''Sets the value of a date field (due, complete, act begin, est begin,
@@ -583,7 +754,7 @@ class HiToDo(Gtk.Window):
                 dt = ""
 
         self.tasklist[path][field] = dt
-        self.__push_undoable("change", (path, field, old_val, dt))
+        self.__push_change(path, field, old_val, dt)
 
     def commit_status(self, widget=None, path=None, new_status=None):
         '''Sets the status string of 'path' to the value of new_status
@@ -593,15 +764,13 @@ class HiToDo(Gtk.Window):
         '''
         if path is None: return
 
-        #add the new status to our lists if necessary
-        if new_status != '' and new_status not in self.statii_list:
-            self.statii.append([new_status]) #liststore
-            self.statii_list.append(new_status) #normal list
+        #add the new status to our list if necessary
+        self.statii.add(new_status)
         old_status = self.tasklist[path][11]
 
         self.tasklist[path][11] = new_status
         self.track_focus(widget = self.task_view)
-        self.__push_undoable("change", (path, 11, old_status, new_status))
+        self.__push_change(path, 11, old_status, new_status)
 
     def commit_assigner(self, widget=None, path=None, new_assigner=None):
         '''Sets the status string of 'path' to the value of new_assigner
@@ -611,14 +780,12 @@ class HiToDo(Gtk.Window):
         '''
         if path is None: return
 
-        if new_assigner != '' and new_assigner not in self.assigners_list:
-            self.assigners.append([new_assigner])
-            self.assigners_list.append(new_assigner)
+        self.assigners.add(new_assigner)
         old_assigner = self.tasklist[path][9]
 
         self.tasklist[path][9] = new_assigner
         self.track_focus(widget = self.task_view)
-        self.__push_undoable("change", (path, 9, old_assigner, new_assigner))
+        self.__push_change(path, 9, old_assigner, new_assigner)
 
     def commit_assignee(self, widget=None, path=None, new_assignee=None):
         '''Sets the status string of 'path' to the value of new_assignee
@@ -628,14 +795,12 @@ class HiToDo(Gtk.Window):
         '''
         if path is None: return
 
-        if new_assignee != '' and new_assignee not in self.assignees_list:
-            self.assignees.append([new_assignee])
-            self.assignees_list.append(new_assignee)
+        self.assignees.add(new_assignee)
         old_assignee = self.tasklist[path][10]
 
         self.tasklist[path][10] = new_assignee
         self.track_focus(widget = self.task_view)
-        self.__push_undoable("change", (path, 10, old_assignee, new_assignee))
+        self.__push_change(path, 10, old_assignee, new_assignee)
 
     def commit_notes(self, widget=None, data=None):
         '''Saves the user-entered notes text to the notes field'''
@@ -648,11 +813,11 @@ class HiToDo(Gtk.Window):
         end = self.notes_buff.get_iter_at_offset(-1)
         text = self.notes_buff.get_text(start, end, False)
 
-        path = self.tasklist.get_path(self.seliter)
-        oldtext = self.tasklist[self.seliter][14]
+        oldtext = self.notes.get(self.tasklist[self.seliter][20], '')
+        if text == oldtext: return
 
-        self.tasklist[self.seliter][14] = text
-        self.__push_undoable("notes", (path, oldtext, text))
+        self.__set_note(self.seliter, text)
+        self.__push_undoable("notes", (self.tasklist[self.seliter][20], oldtext, text))
 
     def commit_title(self, widget=None, path=None, new_title=None):
         '''Saves the user-entered title.
@@ -687,7 +852,7 @@ class HiToDo(Gtk.Window):
 
         #finally, set the new title if allowed
         self.tasklist[path][13] = new_title
-        self.__push_undoable("change", (path, 13, old_title, new_title))
+        self.__push_change(path, 13, old_title, new_title)
 
     def title_edit_start(self, renderer, editor, path):
         '''Set up the title editor widget
@@ -729,34 +894,20 @@ class HiToDo(Gtk.Window):
         and est are recaulculated.
         '''
         if self.sellist is None: return
-        refs = []
-        #first we get references to each row
-        for path in self.sellist:
-            path = str(path)
-            #stop tracking if needed
-            if self.tasklist[path][17]:
-                self.track_action.set_active(False)
-            refs.append((self.tasklist.get_iter(path), path, path.count(':')))
-
-        refs.sort(key=operator.itemgetter(2))
+        #children of selected rows go along with them anyway
+        paths = self.__topmost(self.sellist)
+        refs = [self.tasklist.get_iter(path) for path in paths]
 
-        #push action tuple to undo buffer
+        #push action tuple to undo buffer, restoring after our first row's previous sibling
         row_data = []
-        self.__do_copy_real(self.sellist, row_data)
-        path = self.tasklist.get_path(refs[0][0])
-        path.prev()
-        spath = path.to_string()
-        path.up()
-        ppath = path.to_string()
-        self.__push_undoable("del", (ppath, spath, row_data)),
-
-        #now we can remove them without invalidating paths
-        for ref, path, pathlen in refs:
-            self.commit_work(path=path, new_work=0, work_type='spent')
-            self.commit_work(path=path, new_work=0, work_type='est')
+        self.__do_copy_real(paths, row_data)
+        parent_iter = self.tasklist.iter_parent(refs[0])
+        sibling_iter = self.tasklist.iter_previous(refs[0])
+        parent_id = self.tasklist[parent_iter][20] if parent_iter is not None else None
+        sibling_id = self.tasklist[sibling_iter][20] if sibling_iter is not None else None
+        self.__push_undoable("del", (parent_id, sibling_id, self.__pack_rows(row_data)))
 
-            self.tasklist.remove(ref)
-            self.calc_parent_pct(path)
+        self.__remove_rows(refs)
 
         self.task_selected(self.selection)
 
@@ -765,15 +916,99 @@ class HiToDo(Gtk.Window):
 
         Ends tracking and recalculates parent time spent, est, and pct complete.
         '''
-        #stop tracking if needed
-        if self.tasklist[path][17]:
-            self.track_action.set_active(False)
-        treeiter = self.tasklist.get_iter(path)
+        self.__remove_rows([self.tasklist.get_iter(path)])
+
+    def __remove_rows(self, iters):
+        '''Removes the rows at iters along with all of their children
 
-        self.commit_work(path=path, new_work=0, work_type='spent')
-        self.commit_work(path=path, new_work=0, work_type='est')
-        self.tasklist.remove(treeiter)
-        self.calc_parent_pct(str(path))
+        Tracking is ended as needed. The removed work time is taken off the
+        rows' ancestors in a single rollup, then the leaf counters and pct
+        complete of each affected parent are recounted. No row in iters may be
+        a descendant of another.
+        '''
+        leaves = sum(self.tasklist[treeiter][18] for treeiter in iters)
+        with self.bulk_edit(detach=leaves > self.BULK_VIEW_LIMIT):
+            #stop tracking first, so the tracked time is rolled up before the
+            #removed rows' totals are read
+            for treeiter in iters:
+                if self.tracking is not None:
+                    if self.tasklist[treeiter][17] or self.tasklist.is_ancestor(treeiter, self.tracking):
+                        self.track_action.set_active(False)
+
+            parents = []
+            self.begin_rollup()
+            for treeiter in iters:
+                row = self.tasklist[treeiter]
+                self.rollup(treeiter, {2: -row[2], 3: -row[3]})
+
+                parent_iter = self.tasklist.iter_parent(treeiter)
+                if parent_iter is not None:
+                    parents.append(parent_iter)
+            self.end_rollup()
+
+            for treeiter in iters:
+                self.__forget_rows(treeiter)
+                self.tasklist.remove(treeiter)
+
+            #parents are never removed here, so their iters are still good
+            done = set()
+            for parent_iter in parents:
+                path = self.tasklist.get_path(parent_iter).to_string()
+                if path not in done:
+                    done.add(path)
+                    self.__recount_leaves(parent_iter)
+
+    def __topmost(self, paths):
+        '''Returns the paths which do not have an ancestor in paths'''
+
+        chosen = set(tuple(int(i) for i in str(path).split(':')) for path in paths)
+        topmost = []
+        for path in paths:
+            indices = tuple(int(i) for i in str(path).split(':'))
+            if not any(indices[:n] in chosen for n in range(1, len(indices))):
+                topmost.append(path)
+        return topmost
+
+    def __new_row_id(self):
+        '''Returns an unused row id for column 20'''
+
+        self.last_row_id += 1
+        return self.last_row_id
+
+    def __forget_rows(self, treeiter):
+        '''Drops treeiter and all of its children from self.row_ids
+
+        Must be called before the rows are removed.
+        '''
+        row_id = self.tasklist[treeiter][20]
+        del self.row_ids[row_id]
+        self.notes.pop(row_id, None)
+        for index in self.row_indexes:
+            index.forget(row_id)
+        child_iter = self.tasklist.iter_children(treeiter)
+        while child_iter is not None:
+            self.__forget_rows(child_iter)
+            child_iter = self.tasklist.iter_next(child_iter)
+
+    def __set_note(self, treeiter, note):
+        '''Stores note as the full note of treeiter's row and updates its preview'''
+
+        row_id = self.tasklist[treeiter][20]
+        if note:
+            self.notes[row_id] = note
+        else:
+            self.notes.pop(row_id, None)
+        self.tasklist[treeiter][14] = tools.note_preview(note)
+
+    def __take_note(self, row):
+        '''Moves the full note out of a row which is about to be inserted
+
+        The note is stored under the row's id and column 14 of row is left
+        holding its preview.
+        '''
+        if row[14]:
+            self.notes[row[20]] = row[14]
+            row[14] = tools.note_preview(row[14])
 
     def task_selected(self, widget):
         '''Stores references to the task(s) selected by the user
@@ -782,7 +1017,7 @@ class HiToDo(Gtk.Window):
         editing controls (cut, copy, paste, etc.) as needed.
         '''
         self.selcount = widget.count_selected_rows()
-        self.sellist = widget.get_selected_rows()[1]
+        self.sellist = [self.__list_path(path) for path in widget.get_selected_rows()[1]]
 
         #if there's anything in the list, commit our changes
         self.commit_all()
@@ -791,7 +1026,7 @@ class HiToDo(Gtk.Window):
         if self.selcount == 1:
             self.seliter = self.tasklist.get_iter(self.sellist[0])
             self.parent = self.tasklist.iter_parent(self.seliter)
-            self.notes_buff.set_text(self.tasklist[self.seliter][14])
+            self.notes_buff.set_text(self.notes.get(self.tasklist[self.seliter][20], ''))
 
             #enable controls which can act on a singleton
             self.task_cut.set_sensitive(True)
@@ -879,7 +1114,7 @@ class HiToDo(Gtk.Window):
             #disconnect selection changed handler
             self.selection.disconnect(self.sel_changed_handler)
             #invert recursively
-            self.__invert_tasklist_selection(self.tasklist_filter.get_iter_first())
+            self.__invert_tasklist_selection(self.task_view.get_model().get_iter_first())
             #reconnect selection changed handler
             self.sel_changed_handler = self.selection.connect("changed", self.task_selected)
             self.task_selected(self.selection)
@@ -887,6 +1122,7 @@ class HiToDo(Gtk.Window):
     def __invert_tasklist_selection(self, treeiter):
         '''Recursively switches each row's selected status'''
 
+        model = self.task_view.get_model()
         while treeiter != None:
             #swap selection state on iter
             if self.selection.iter_is_selected(treeiter):
@@ -895,10 +1131,10 @@ class HiToDo(Gtk.Window):
                 self.selection.select_iter(treeiter)
 
             #probe children
-            if self.tasklist_filter.iter_has_child(treeiter):
-                child_iter = self.tasklist_filter.iter_children(treeiter)
+            if model.iter_has_child(treeiter):
+                child_iter = model.iter_children(treeiter)
                 self.__invert_tasklist_selection(child_iter)
-            treeiter = self.tasklist_filter.iter_next(treeiter)
+            treeiter = model.iter_next(treeiter)
 
     def expand_all(self, widget=None):
         '''Expands all tasks'''
@@ -918,6 +1154,127 @@ class HiToDo(Gtk.Window):
         else:
             self.notes_view.grab_focus()
 
+    def show_search(self, widget=None):
+        '''Shows the search bar and focuses its entry'''
+
+        self.search_bar.set_visible(True)
+        self.search_entry.grab_focus()
+
+    def hide_search(self, widget=None):
+        '''Hides the search bar and returns focus to the task list'''
+
+        self.search_bar.set_visible(False)
+        self.task_view.grab_focus()
+
+    def search_keys_dn(self, widget=None, event=None):
+        '''Closes the search bar on Escape'''
+
+        if Gdk.keyval_name(event.keyval) == "Escape":
+            self.hide_search()
+            return True
+        return False
+
+    def search_changed(self, widget=None):
+        '''Jumps to the first match at or after the selected task as a query is typed'''
+
+        self.__search_jump(0)
+
+    def find_next(self, widget=None):
+        '''Jumps to the next task matching the search bar's query'''
+
+        if self.search_entry.get_text() == "":
+            self.show_search()
+            return
+        self.__search_jump(1)
+
+    def find_prev(self, widget=None):
+        '''Jumps to the previous task matching the search bar's query'''
+
+        if self.search_entry.get_text() == "":
+            self.show_search()
+            return
+        self.__search_jump(-1)
+
+    def __search_jump(self, step):
+        '''Selects the nearest task in tree order which matches the search query
+
+        step is 1 for the first match after the selected task, -1 for the last
+        one before it, and 0 to stay on the selected task if it matches. The
+        search wraps around at either end of the list. Tasks hidden by the
+        filter are skipped.
+
+        The matches come from self.search_index. When there are only a few,
+        their paths are sorted to find the next one. Otherwise the tree is
+        walked from the selected task, which soon runs into one.
+        '''
+        query = self.search_entry.get_text()
+        hits = self.search_index.search(query)
+        if self.tasklist_filter is not None:
+            hits = set(row_id for row_id in hits if self.tasklist[self.row_ids[row_id]][21])
+
+        if not hits:
+            self.search_count.set_text("Not found" if query.strip() else "")
+            return
+        self.search_count.set_text("%d found" % len(hits))
+
+        if len(hits) <= self.SEARCH_SORT_LIMIT:
+            found = sorted((self.tasklist.get_path(self.row_ids[row_id]).get_indices(), row_id) for row_id in hits)
+            if self.seliter is None:
+                n = -1 if step < 0 else 0
+            else:
+                here = (self.tasklist.get_path(self.seliter).get_indices(),)
+                if step > 0:
+                    n = bisect_right(found, (here[0], sys.maxint))
+                elif step < 0:
+                    n = bisect_left(found, here) - 1
+                else:
+                    n = bisect_left(found, here)
+            treeiter = self.row_ids[found[n % len(found)][1]]
+        else:
+            move = self.__prev_row if step < 0 else self.__next_row
+            treeiter = self.seliter
+            if step != 0 or treeiter is None:
+                treeiter = move(treeiter)
+            while self.tasklist[treeiter][20] not in hits:
+                treeiter = move(treeiter)
+
+        path = self.__list_to_view(self.tasklist.get_path(treeiter))
+        if path is None: return
+        if path.get_depth() > 1:
+            parent_path = path.copy()
+            parent_path.up()
+            self.task_view.expand_to_path(parent_path)
+        self.task_view.set_cursor(path, None, False)
+
+    def __next_row(self, treeiter):
+        '''Returns the row after treeiter in tree order, wrapping around to the first'''
+
+        if treeiter is not None:
+            child_iter = self.tasklist.iter_children(treeiter)
+            if child_iter is not None: return child_iter
+            while treeiter is not None:
+                next_iter = self.tasklist.iter_next(treeiter)
+                if next_iter is not None: return next_iter
+                treeiter = self.tasklist.iter_parent(treeiter)
+        return self.tasklist.get_iter_first()
+
+    def __prev_row(self, treeiter):
+        '''Returns the row before treeiter in tree order, wrapping around to the last'''
+
+        prev_iter = None
+        if treeiter is not None:
+            prev_iter = self.tasklist.iter_previous(treeiter)
+            if prev_iter is None:
+                parent_iter = self.tasklist.iter_parent(treeiter)
+                if parent_iter is not None: return parent_iter
+        if prev_iter is None:
+            prev_iter = self.tasklist.iter_nth_child(None, self.tasklist.iter_n_children(None) - 1)
+
+        #the row before a sibling is that sibling's last descendant
+        while self.tasklist.iter_has_child(prev_iter):
+            prev_iter = self.tasklist.iter_nth_child(prev_iter, self.tasklist.iter_n_children(prev_iter) - 1)
+        return prev_iter
+
     def pick_cols(self, widget=None):
         '''Changes column visibility based on the results of the column picker dialog
 
@@ -957,7 +1314,21 @@ class HiToDo(Gtk.Window):
         '''
         if not self.confirm_discard(): return
 
-        self.tasklist.clear()
+        self.__reset_list()
+
+    def __reset_list(self):
+        '''Empties the task list and restores every per-file setting to its default
+
+        Used by new_file() and to throw away a partially loaded file.
+        '''
+        self.set_filter(None)
+        with self.bulk_edit(detach=False):
+            for index in self.row_indexes:
+                index.drop_index()
+            self.tasklist.clear()
+            self.row_ids.clear()
+            self.notes.clear()
+            self.last_row_id = 0
 
         #clear undo and redo buffers
         del self.undobuffer[:]
@@ -968,19 +1339,9 @@ class HiToDo(Gtk.Window):
         self.display_columns(self.cols_visible)
 
         #reset to default assigners, assignees, and statii
-        self.assigners_list = self.settings.get("default-from")[:]
-        self.assignees_list = self.settings.get("default-to")[:]
-        self.statii_list = self.settings.get("default-status")[:]
-
-        self.assigners.clear()
-        self.assignees.clear()
-        self.statii.clear()
-        for n in self.assigners_list:
-            self.assigners.append([n])
-        for n in self.assignees_list:
-            self.assignees.append([n])
-        for n in self.statii_list:
-            self.statii.append([n])
+        self.assigners.set_labels(self.settings.get("default-from"))
+        self.assignees.set_labels(self.settings.get("default-to"))
+        self.statii.set_labels(self.settings.get("default-status"))
 
         self.file_name = ""
         self.file_dirty = False
@@ -1033,24 +1394,48 @@ class HiToDo(Gtk.Window):
         '''Loads the file at self.file_name using the reader self.file_filter
 
         We let self.file_filter process the file and put its data into a dict.
-        Save version is checked for compatability and then we use that dict to
-        populate our real internal vars.
+        Tasks are read directly into self.tasklist while it is detached from
+        the view. Save version is checked for compatability and then we use
+        that dict to populate our real internal vars.
         '''
-        templist = tools.copy_treemodel(self.tasklist)
         data = {
             'filename': self.file_name,
             'from_list': [],
             'to_list': [],
             'status_list': [],
-            'task_store': templist,
+            'task_store': self.tasklist,
+            'row_ids': self.row_ids,
+            'notes': self.notes,
             'cols': [],
             'geometry': ()
             #data also has save_version, our_version, expanded, and selected keys
         }
-        try:
-            self.file_filter.read_to_store(data)
-        except (ParseError, IOError, ReadError, KeyError):
-            dlg = dialogs.misc.htd_file_read_error(self, self.file_name)
+
+        #rows are read straight into our own store, so we disable the display
+        #until we're done
+        self.set_filter(None)
+        self.task_view.freeze_child_notify()
+        self.task_view.set_model(None)
+        #the dirty handlers would otherwise retitle the window for every row read
+        with self.bulk_edit(detach=False):
+            for index in self.row_indexes:
+                index.drop_index()
+            self.tasklist.clear()
+            self.row_ids.clear()
+            self.notes.clear()
+            self.last_row_id = 0
+
+            #a malformed file can fail in any field's parsing, and whatever
+            #the error, the view has to be given back below
+            try:
+                self.file_filter.read_to_store(data)
+                read_ok = True
+            except Exception:
+                read_ok = False
+
+        if not read_ok:
+            self.__abort_open()
+            dlg = dialogs.misc.htd_file_read_error(self, data['filename'])
             dlg.run()
             dlg.destroy()
             return
@@ -1066,39 +1451,21 @@ class HiToDo(Gtk.Window):
                 data['filename'] = self.pick_savefile()
                 force_save = True
             elif response == Gtk.ResponseType.CANCEL:
+                self.__abort_open()
                 return
 
         self.file_name = data['filename']
-        self.assigners_list = data['from_list']
-        self.assignees_list = data['to_list']
-        self.statii_list = data['status_list']
-        #self.tasklist is handled later
+        #self.tasklist and self.row_ids were filled by the reader
+        self.search_index.set_loader(data.get('search_index'))
+        self.last_row_id = max(self.row_ids) if self.row_ids else 0
         cols = data['cols']
         rows_to_expand = data['expanded']
         selme = data['selected']
 
-        #add rows
-        #when adding lots of rows, we want to disable the display until we're done
-        self.task_view.freeze_child_notify()
-        self.task_view.set_model(None)
-        self.tasklist.clear()
-        #TODO clear filter
-        #self.tasklist_filter.refilter()
-
-        #now we can import the task list data from templist
-        templist.foreach(tools.append_row, self.tasklist)
-        del templist
-
-        #iterate assigners, assignees, and statii to put names into respective liststores
-        self.assigners.clear()
-        self.assignees.clear()
-        self.statii.clear()
-        for n in self.assigners_list:
-            self.assigners.append([n])
-        for n in self.assignees_list:
-            self.assignees.append([n])
-        for n in self.statii_list:
-            self.statii.append([n])
+        #load assigners, assignees, and statii
+        self.assigners.set_labels(data['from_list'])
+        self.assignees.set_labels(data['to_list'])
+        self.statii.set_labels(data['status_list'])
 
         #show requested columns
         self.cols_visible = [n for n, v in cols if v]
@@ -1126,7 +1493,6 @@ class HiToDo(Gtk.Window):
         if selme != '' and selme is not None:
             try:
                 treeiter = self.tasklist.get_iter(selme)
-                self.tasklist_filter.convert_child_iter_to_iter(treeiter)
                 self.selection.select_iter(treeiter)
             except ValueError:
                 self.selection.unselect_all()
@@ -1148,6 +1514,16 @@ class HiToDo(Gtk.Window):
         if force_save:
             self.save_file()
 
+    def __abort_open(self):
+        '''Throws away a partially read file and reconnects the task view
+
+        The reader fills self.tasklist directly, so there is no earlier list to
+        go back to. We start over with an empty, untitled list instead.
+        '''
+        self.__reset_list()
+        self.task_view.set_model(self.tasklist)
+        self.task_view.thaw_child_notify()
+
     def pick_savefile(self):
         '''Prompts the user to pick a save location
 
@@ -1174,25 +1550,26 @@ class HiToDo(Gtk.Window):
 
         return filename
 
-    def save_file_as(self, widget=None):
+    def save_file_as(self, widget=None, wait=False):
         '''Prompts user for a save location using pick_savefile() and then saves
         there using __do_save()
 
         The location is preserved for future saves.
         '''
         self.file_name = self.pick_savefile()
-        self.__do_save(self.file_name, self.tasklist)
+        self.__do_save(self.file_name, self.tasklist, wait=wait)
 
-    def save_file(self, widget=None):
+    def save_file(self, widget=None, wait=False):
         '''Writes the current list to the saved file location
 
         If we don't have a location yet, the user is prompted to choose one.
+        When wait is True, we only return once the file is written.
         '''
         if self.file_name == "":
-            self.save_file_as()
+            self.save_file_as(wait=wait)
             return
 
-        self.__do_save(self.file_name, self.tasklist)
+        self.__do_save(self.file_name, self.tasklist, wait=wait)
 
     def save_copy(self, widget=None):
         '''Prompts user for a save location using pick_savefile() and then saves
@@ -1203,11 +1580,20 @@ class HiToDo(Gtk.Window):
         filename = self.pick_savefile()
         self.__do_save(filename, self.tasklist)
 
-    def __do_save(self, filename, tasklist, append=False, file_filter=None):
+    def __do_save(self, filename, tasklist, append=False, file_filter=None, wait=False, roots=None):
         '''Writes our data to the file at 'filename'
 
         The data is bundled into a dict and all the writing is handled by a
-        filter from file_parsers.
+        filter from file_parsers. The filter copies the task list into plain
+        tuples right away, then builds, compresses, and writes the file on a
+        worker thread unless wait is True. The outcome is reported by
+        __save_done() once the write is finished.
+
+        If roots is a list of iters, only those rows and their children are
+        saved. When waiting, returns whether the save worked.
+
+        Appending, as archive_done() does, writes to some other file than
+        ours, so it never marks the list clean.
         '''
         if file_filter is None: file_filter = fileParser.pick_filter(filename)
 
@@ -1226,25 +1612,96 @@ class HiToDo(Gtk.Window):
 
         data = {
             'filename': filename,
-            'from_list': sorted(self.assigners_list),
-            'to_list': sorted(self.assignees_list),
-            'status_list': sorted(self.statii_list),
+            'from_list': self.assigners.sorted(),
+            'to_list': self.assignees.sorted(),
+            'status_list': self.statii.sorted(),
             'task_store': tasklist,
+            'notes': self.notes,
             'task_view': self.task_view,
             'selection': selpath,
             'cols': present+absent,
-            'geometry': (self.maximized, width, height, task_width)
+            'geometry': (self.maximized, width, height, task_width),
+            'compression': self.settings.get("save-compression"),
+            'backups': self.settings.get("backup-count"),
+            'task_roots': roots
         }
+        file_filter.snapshot(data)
+
+        #only one save runs at a time
+        self.wait_for_save()
+
+        #edits made after the snapshot must keep the file dirty
+        generation = None if append else self.dirty_generation
+        if wait:
+            ok = self.__write_file(file_filter, data, append)
+            self.__save_done(ok, generation)
+            return ok
+        else:
+            self.save_thread = Thread(target=self.__save_worker, args=(file_filter, data, append, generation))
+            self.save_thread.start()
+
+    def __write_file(self, file_filter, data, append):
+        '''Has file_filter write data and returns whether that worked'''
+
         try:
             file_filter.write(data, append)
-        except IOError:
+        except EnvironmentError:
+            return False
+        return True
+
+    def __save_worker(self, file_filter, data, append, generation):
+        '''Writes a snapshot on the save thread
+
+        Nothing here may touch the gui. The result is handed back to the main
+        loop instead, and any error the write didn't expect still reports the
+        save as failed.
+        '''
+        ok = False
+        try:
+            ok = self.__write_file(file_filter, data, append)
+        finally:
+            self.save_result = (ok, generation)
+            GLib.idle_add(self.__finish_save)
+
+    def __finish_save(self):
+        '''Reports the result left by the save thread, unless that was already done
+
+        Runs as an idle handler once the thread is finished, and from
+        wait_for_save().
+        '''
+        result = self.save_result
+        self.save_result = None
+        if result is not None:
+            self.__save_done(*result)
+        return False #don't run again as an idle handler
+
+    def __save_done(self, ok, generation):
+        '''Reports the outcome of a save
+
+        The list is only marked clean if it has not changed since the save's
+        snapshot was taken. A generation of None means the save didn't write
+        the list's own file, so only a failure is reported.
+        '''
+        if not ok:
             self.save_warn_dlg.run()
+            self.save_warn_dlg.hide()
             return
+        if generation is None: return
 
-        self.file_dirty = False
+        if generation == self.dirty_generation:
+            self.file_dirty = False
         self.update_title()
         self.last_save = datetime.now()
 
+    def wait_for_save(self):
+        '''Blocks until the running background save, if any, has finished and
+        reports its outcome'''
+
+        if self.save_thread is not None:
+            self.save_thread.join()
+            self.save_thread = None
+            self.__finish_save()
+
     def confirm_discard(self):
         '''Warns the user about discarding changes
 
@@ -1252,6 +1709,8 @@ class HiToDo(Gtk.Window):
 
         Returns True if the user wants to discard their changes, and False otherwise.
         '''
+        #a save that is still being written may be all we need
+        self.wait_for_save()
         if not self.file_dirty: return True
 
         #get the right unit
@@ -1283,7 +1742,7 @@ class HiToDo(Gtk.Window):
 
         if retval == -3:
             #save
-            self.save_file()
+            self.save_file(wait=True)
             return not self.file_dirty
         elif retval == -7:
             #discard
@@ -1296,8 +1755,104 @@ class HiToDo(Gtk.Window):
         '''Marks data as unsaved and changes the title to reflect this using update_title()'''
 
         self.file_dirty = True
+        self.dirty_generation += 1
         self.update_title()
 
+    @contextmanager
+    def bulk_edit(self, detach=True):
+        '''Groups a large change to the task list into a single update
+
+        While active, the row signals which mark the file dirty are blocked,
+        and the task view is detached from its model when detach is True so
+        it does not redraw or re-sort for every row. On exit the view is
+        reattached with its expanded rows, selection, and scroll position
+        restored, and the file is marked dirty once.
+
+        Nested calls only take effect at the outermost level.
+        '''
+        self.bulk_depth += 1
+        view_state = None
+        if self.bulk_depth == 1:
+            for handler in self.dirty_handlers:
+                self.tasklist.handler_block(handler)
+            if detach:
+                view_state = self.__detach_view()
+        try:
+            yield
+        finally:
+            self.bulk_depth -= 1
+            if self.bulk_depth == 0:
+                if view_state is not None:
+                    self.__attach_view(view_state)
+                for handler in self.dirty_handlers:
+                    self.tasklist.handler_unblock(handler)
+                self.make_dirty()
+
+    def __detach_view(self):
+        '''Takes the model away from the task view, remembering its state
+
+        Returns a tuple for __attach_view(), or None if the view has no model.
+        '''
+        model = self.task_view.get_model()
+        if model is None: return None
+
+        #row ids follow their rows while the model changes underneath
+        expanded = []
+        self.task_view.map_expanded_rows(
+            lambda view, path, data: expanded.append(model[path][20]), None)
+        selected = [model[path][20] for path in self.selection.get_selected_rows()[1]]
+        cursor = self.task_view.get_cursor()[0]
+        cursor = model[cursor][20] if cursor is not None else None
+        visible = self.task_view.get_visible_range()
+        top = model[visible[0]][20] if visible else None
+
+        #selection changes are only reported once, on reattach
+        self.selection.handler_block(self.sel_changed_handler)
+        self.task_view.freeze_child_notify()
+        self.task_view.set_model(None)
+        return (model, expanded, selected, cursor, top)
+
+    def __attach_view(self, state):
+        '''Gives the task view its model back and restores the state saved by
+        __detach_view()'''
+
+        model, expanded, selected, cursor, top = state
+        self.task_view.set_model(model)
+
+        #parents are always listed before their children
+        for row_id in expanded:
+            path = self.__view_path(row_id, model)
+            if path is not None:
+                self.task_view.expand_row(path, False)
+
+        #setting the cursor selects its row, so the selection comes after
+        path = self.__view_path(cursor, model)
+        if path is not None:
+            self.task_view.set_cursor(path, None, False)
+        self.selection.unselect_all()
+        for row_id in selected:
+            path = self.__view_path(row_id, model)
+            if path is not None:
+                self.selection.select_path(path)
+        path = self.__view_path(top, model)
+        if path is not None:
+            self.task_view.scroll_to_cell(path, None, True, 0.0, 0.0)
+
+        self.task_view.thaw_child_notify()
+        self.selection.handler_unblock(self.sel_changed_handler)
+        self.task_selected(self.selection)
+
+    def __view_path(self, row_id, model):
+        '''Returns the path of the row with row_id in model, or None if the
+        row is gone or model doesn't show it'''
+
+        treeiter = self.row_ids.get(row_id)
+        if treeiter is None: return None
+        path = self.tasklist.get_path(treeiter)
+        if model is not self.tasklist:
+            path = model.convert_child_path_to_path(path)
+        return path
+
     def update_title(self):
         '''Updates the window's title to reflect the current file's name, path,
         and dirty state'''
@@ -1365,12 +1920,20 @@ class HiToDo(Gtk.Window):
             # We store a parent reference along with each row's data. At the top
             # level, that reference is obviously nothing, but children refer to
             # their parent iters to maintain the tree.
-            rowlist.append(self.tasklist[path][:])
             treeiter = self.tasklist.get_iter(path)
+            rowlist.append(self.__copy_row(treeiter))
             if recurse:
                 rowlist[-1].append(self.__copy_children(treeiter))
         return row_texts
 
+    def __copy_row(self, treeiter):
+        '''Returns a list of the values of treeiter's row, with its full note
+        in place of the preview'''
+
+        row = self.tasklist[treeiter][:]
+        row[14] = self.notes.get(row[20], '')
+        return row
+
     def __copy_children(self, treeiter):
         '''Makes shallow copies of the children of treeiter
 
@@ -1384,7 +1947,7 @@ class HiToDo(Gtk.Window):
 
         child_iter = self.tasklist.iter_children(treeiter)
         while child_iter != None:
-            children.append(self.tasklist[child_iter][:]) # append the child
+            children.append(self.__copy_row(child_iter)) # append the child
             children[-1].append(self.__copy_children(child_iter)) # stick a list of its children on the end
             child_iter = self.tasklist.iter_next(child_iter) # move to the next child
 
@@ -1418,12 +1981,9 @@ class HiToDo(Gtk.Window):
             new_iters = self.__do_paste_real(parent_iter, self.seliter, self.copied_rows)
 
             #push "paste" undo entry
-            ppath = parent_path if parent_iter is not None else None
-            spath = self.sellist[0] if self.seliter is not None else None
-            self.__push_undoable("paste", (ppath, spath, self.copied_rows[:], new_iters))
+            self.__push_pasted(parent_iter, self.seliter, new_iters)
 
-            self.selection.unselect_all()
-            self.selection.select_iter(new_iters[0])
+            self.__select_row(new_iters[0])
 
     def __do_paste_real(self, parent_iter, sibling_iter, row_data, sanitize=True):
         '''Creates new rows and populates them with data from the internal clipboard
@@ -1433,34 +1993,56 @@ class HiToDo(Gtk.Window):
         rows. Setting that flag to false forces all row data to be copied
         verbatim, which is good when dealing with undo/redo operations.
         '''
+        leaves = sum(row[18] for row in row_data)
+        with self.bulk_edit(detach=leaves > self.BULK_VIEW_LIMIT):
+            new_iters = self.__paste_rows(parent_iter, sibling_iter, row_data, sanitize)
+
+            #pasted rows already hold the totals of their own children, so only
+            #the new top-level rows add their work time to their ancestors
+            self.begin_rollup()
+            for treeiter in new_iters:
+                row = self.tasklist[treeiter]
+                self.rollup(treeiter, {2: row[2], 3: row[3]})
+            self.end_rollup()
+
+            #pasted rows carry their own leaf counters, so only our parent needs a recount
+            self.calc_parent_pct(self.tasklist.get_path(new_iters[0]).to_string())
+
+        return new_iters
+
+    def __paste_rows(self, parent_iter, sibling_iter, row_data, sanitize):
+        '''Recursively inserts rows from row_data after sibling_iter
+
+        Returns a list of iters for the rows added at the top level.
+        '''
         new_iters = []
 
         #iterate row data and add it
         for row in row_data:
             new_row = self.defaults[:]
             if sanitize:
-                inherit = [0,4,5,8,9,10,11,13,14] #columns to preserve from original row
+                inherit = [0,2,4,5,8,9,10,11,13,14,18] #columns to preserve from original row
                 for i in inherit:
                     new_row[i] = row[i]
             else:
                 for i in range(len(self.defaults)):
                     new_row[i] = row[i]
 
+            #restored rows keep their old ids so undo entries still find them
+            if new_row[20] == 0 or new_row[20] in self.row_ids:
+                new_row[20] = self.__new_row_id()
+            self.__take_note(new_row)
+
             #add the new row with its data
             treeiter = self.tasklist.insert_after(parent_iter, sibling_iter, new_row)
+            self.row_ids[new_row[20]] = treeiter
             new_iters.append(treeiter)
 
             if row[-1]:
-                self.__do_paste_real(treeiter, None, row[-1], sanitize)
+                self.__paste_rows(treeiter, None, row[-1], sanitize)
 
             sibling_iter = treeiter # next row should be our sibling
 
-            #update time est and percent separately
-            path = self.tasklist.get_path(treeiter)
-            self.commit_work(path=path, new_work=row[2]/3600, work_type='est')
-            self.calc_parent_pct(path.to_string())
-
-        self.make_dirty()
         return new_iters
 
     def do_paste_into(self, widget=None):
@@ -1472,12 +2054,9 @@ class HiToDo(Gtk.Window):
         new_iters = self.__do_paste_real(self.seliter, None, self.copied_rows)
 
         #push "paste" undo
-        ppath = self.sellist[0]
-        self.__push_undoable("paste", (ppath, None, self.copied_rows[:], new_iters))
+        self.__push_pasted(self.seliter, None, new_iters)
 
-        self.task_view.expand_to_path(self.tasklist.get_path(new_iters[0]))
-        self.selection.unselect_all()
-        self.selection.select_iter(new_iters[0])
+        self.__select_row(new_iters[0], True)
         self.make_dirty()
 
     def do_undo(self, widget=None):
@@ -1499,105 +2078,106 @@ class HiToDo(Gtk.Window):
 
             #get action tuple
             action = self.undobuffer.pop()
+            self.last_change_time = 0
             #execute action's inverse
             if action[0] == "add":
-                paths = action[1]
-                data = self.tasklist[paths[0]][:]
-                self.del_task(paths[0])
-                self.redobuffer.append((action[0], (paths, data)))
+                ids = action[1]
+                treeiter = self.row_ids[ids[0]]
+                data = self.__pack_row(self.__copy_row(treeiter))
+                self.__remove_rows([treeiter])
+                self.redobuffer.append((action[0], (ids, data)))
             elif action[0] == "notes":
-                path = action[1][0]
+                treeiter = self.row_ids[action[1][0]]
                 oldtext = action[1][1]
-                self.tasklist[path][14] = oldtext
-                if self.sellist[0] == path:
+                self.__set_note(treeiter, oldtext)
+                if self.seliter is not None and self.tasklist[self.seliter][20] == action[1][0]:
                     self.notes_buff.set_text(oldtext)
                 self.redobuffer.append(action)
             elif action[0] == "change":
                 # Handler generic field changes. Anything that needs extra
                 # processing should get its own handler.
                 params = action[1]
-                path = params[0]
+                treeiter = self.row_ids[params[0]]
                 field = params[1]
                 oldval = params[2]
-                self.tasklist[path][field] = oldval
+                self.tasklist[treeiter][field] = oldval
                 self.redobuffer.append(action)
             elif action[0] == "spent":
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]])
                 oldval = action[1][1]
                 self.commit_work(path=path, new_work=oldval/3600, work_type='spent')
                 self.redobuffer.append(action)
             elif action[0] == "est":
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]])
                 oldval = action[1][1]
                 self.commit_work(path=path, new_work=oldval/3600, work_type='est')
                 self.redobuffer.append(action)
             elif action[0] == "done":
-                path = action[1][0]
+                treeiter = self.row_ids[action[1][0]]
+                path = self.tasklist.get_path(treeiter).to_string()
                 oldval = action[1][1]
                 forced = action[1][3]
 
-                if oldval:
-                    # we're undoing a move from done to not-done
+                old_done_leaves = self.tasklist[treeiter][19]
 
-                    # mark path done
-                    self.tasklist[path][1] = 100
-                    self.tasklist[path][12] = True
-                    self.tasklist[path][16] = False
+                #forced rows can make up a whole subtree, so update the view once
+                with self.bulk_edit(detach=self.tasklist[treeiter][18] > self.BULK_VIEW_LIMIT):
+                    if oldval:
+                        # we're undoing a move from done to not-done
 
-                    # mark forced rows done
-                    for row in forced:
-                        self.tasklist[row][12] = True
-                        self.tasklist[row][16] = False
-                else:
-                    # we're undoing a move from not-done to done
+                        # mark path done
+                        values = {1: 100, 12: True, 16: False}
+                        if not self.tasklist.iter_has_child(treeiter):
+                            values[19] = 1
+                        self.update_row(treeiter, values)
 
-                    # mark path Not Done
-                    self.tasklist[path][12] = False
-                    self.tasklist[path][16] = True
+                        # mark forced rows done
+                        for row_id in forced:
+                            self.update_row(self.row_ids[row_id], {12: True, 16: False})
+                    else:
+                        # we're undoing a move from not-done to done
 
-                    # mark forced rows Not Done
-                    for row in forced:
-                        self.tasklist[row][1] = 0
-                        self.tasklist[row][12] = False
-                        self.tasklist[row][16] = True
+                        # mark path Not Done
+                        self.update_row(treeiter, {12: False, 16: True})
 
-                    # recalc self pct complete
-                    self.calc_pct(path)
+                        # mark forced rows Not Done
+                        for row_id in forced:
+                            self.update_row(self.row_ids[row_id], {1: 0, 12: False, 16: True})
 
-                self.calc_parent_pct(path)
+                        # recount our subtree, since only some of it was forced
+                        self.__do_pct(treeiter)
+                        self.calc_pct(path)
+
+                    self.__count_leaves(treeiter, 0, self.tasklist[treeiter][19] - old_done_leaves)
 
                 self.redobuffer.append(action)
             elif action[0] == "paste":
                 data = action[1]
-                for treeiter in data[3]:
-                    #ensure we aren't tracking anything
-                    if self.tasklist[treeiter][17]:
-                        self.track_action.set_active(False)
-
-                    path = self.tasklist.get_path(treeiter)
-                    self.commit_work(path=path, new_work=0, work_type='est')
-                    self.commit_work(path=path, new_work=0, work_type='spent')
-                    self.tasklist.remove(treeiter)
-
-                #update parent pct done
-                if data[0] is not None:
-                    self.calc_pct(data[0])
+                self.__remove_rows([self.row_ids[row_id] for row_id in data[3]])
 
                 self.redobuffer.append(("paste", (data[0], data[1], data[2])))
             elif action[0] == "del":
                 #TODO clean up task order
                 data = action[1]
-                parent_iter = self.tasklist.get_iter(data[0]) if data[0] is not None else None
-                sibling_iter = self.tasklist.get_iter(data[1]) if data[1] is not None else None
-                new_iters = self.__do_paste_real(parent_iter, sibling_iter, data[2], False)
+                parent_iter = self.row_ids[data[0]] if data[0] is not None else None
+                sibling_iter = self.row_ids[data[1]] if data[1] is not None else None
+                new_iters = self.__do_paste_real(parent_iter, sibling_iter, self.__unpack_rows(data[2]), False)
                 self.task_selected(self.selection)
-                self.redobuffer.append(("del", (data[0], data[1], data[2], new_iters)))
+                new_ids = [self.tasklist[treeiter][20] for treeiter in new_iters]
+                self.redobuffer.append(("del", (data[0], data[1], data[2], new_ids)))
             elif action[0] == 'track_spent':
-                path = action[1][0]
-                self.tasklist[path][17] = False
+                treeiter = self.row_ids[action[1][0]]
+                self.tasklist[treeiter][17] = False
                 self.tracking = None
                 self.track_action.set_active(False)
-                self.redobuffer.append(('track_spent', (str(path))))
+                self.redobuffer.append(action)
+            elif action[0] == "relabel":
+                registry, old_label, new_label, row_ids, added = action[1]
+                self.__relabel_rows(registry.column, row_ids, old_label)
+                registry.add(old_label)
+                if added:
+                    registry.discard(new_label)
+                self.redobuffer.append(action)
 
     def do_redo(self, widget=None):
         '''Handles redo logic
@@ -1614,83 +2194,134 @@ class HiToDo(Gtk.Window):
 
             #get action tuple
             action = self.redobuffer.pop()
+            self.last_change_time = 0
             #execute action
             if action[0] == "add":
-                paths = action[1][0]
-                row_data = action[1][1]
-                if paths[2] is not None and paths[1] is not paths[2]:
-                    seliter = self.tasklist.get_iter(paths[2])
+                ids = action[1][0]
+                row_data = self.__unpack_row(action[1][1])
+                self.__take_note(row_data)
+                if ids[2] is not None and ids[1] != ids[2]:
+                    seliter = self.row_ids[ids[2]]
                     new_row_iter = self.tasklist.insert_after(None, seliter, row_data)
                 else:
-                    parent_iter = self.tasklist.get_iter(paths[1]) if paths[1] is not None else None
+                    parent_iter = self.row_ids[ids[1]] if ids[1] is not None else None
                     new_row_iter = self.tasklist.append(parent_iter, row_data)
+                self.row_ids[row_data[20]] = new_row_iter
                 newpath = self.tasklist.get_path(new_row_iter).to_string()
-                self.undobuffer.append((action[0], (newpath, paths[1], paths[2])))
+                self.calc_parent_pct(newpath)
+                self.undobuffer.append((action[0], ids))
             elif action[0] == "notes":
-                path = action[1][0]
+                treeiter = self.row_ids[action[1][0]]
                 newtext = action[1][2]
-                self.tasklist[path][14] = newtext
-                if self.sellist[0] == path:
+                self.__set_note(treeiter, newtext)
+                if self.seliter is not None and self.tasklist[self.seliter][20] == action[1][0]:
                     self.notes_buff.set_text(newtext)
                 self.undobuffer.append(action)
             elif action[0] == "change":
                 # Handler generic field changes. Anything that needs extra
                 # processing should get its own handler.
                 params = action[1]
-                path = params[0]
+                treeiter = self.row_ids[params[0]]
                 field = params[1]
                 newval = params[3]
-                self.tasklist[path][field] = newval
+                self.tasklist[treeiter][field] = newval
                 self.undobuffer.append(action)
             elif action[0] == "spent":
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]])
                 newval = action[1][2]
                 self.commit_work(path=path, new_work=newval/3600, work_type='spent')
                 self.undobuffer.append(action)
             elif action[0] == "est":
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]])
                 newval = action[1][2]
                 self.commit_work(path=path, new_work=newval/3600, work_type='est')
                 self.undobuffer.append(action)
             elif action[0] == "done":
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]]).to_string()
                 newval = action[1][1]
                 self.commit_done(path = path, new_done = not newval)
 
                 self.undobuffer.append(action)
             elif action[0] == "paste":
                 data = action[1]
-                parent_iter = self.tasklist.get_iter(data[0]) if data[0] is not None else None
-                sibling_iter = self.tasklist.get_iter(data[1]) if data[1] is not None else None
-                new_iters = self.__do_paste_real(parent_iter, sibling_iter, data[2])
+                parent_iter = self.row_ids[data[0]] if data[0] is not None else None
+                sibling_iter = self.row_ids[data[1]] if data[1] is not None else None
+                #the packed rows were taken after the first paste, so they go back verbatim
+                new_iters = self.__do_paste_real(parent_iter, sibling_iter, self.__unpack_rows(data[2]), False)
 
-                self.task_view.expand_to_path(self.tasklist.get_path(new_iters[0]))
-                self.selection.unselect_all()
-                self.selection.select_iter(new_iters[0])
+                self.__select_row(new_iters[0], True)
 
-                self.undobuffer.append(("paste", (data[0], data[1], data[2], new_iters)))
+                new_ids = [self.tasklist[treeiter][20] for treeiter in new_iters]
+                self.undobuffer.append(("paste", (data[0], data[1], data[2], new_ids)))
             elif action[0] == "del":
                 data = action[1]
-                for treeiter in data[3]:
-                    #ensure we aren't tracking anything
-                    if self.tasklist[treeiter][17]:
-                        self.track_action.set_active(False)
-
-                    path = self.tasklist.get_path(treeiter)
-                    self.commit_work(path=path, new_work=0, work_type='est')
-                    self.commit_work(path=path, new_work=0, work_type='spent')
-                    self.tasklist.remove(treeiter)
-
-                #update parent pct done
-                if data[0] is not None:
-                    self.calc_pct(data[0])
+                self.__remove_rows([self.row_ids[row_id] for row_id in data[3]])
 
                 self.undobuffer.append(("del", (data[0], data[1], data[2])))
             elif action[0] == 'track_spent':
-                path = action[1][0]
+                path = self.tasklist.get_path(self.row_ids[action[1][0]])
                 self.track_spent(self.track_action, path, True)
                 self.track_action.set_active(True)
-                self.undobuffer.append(('track_spent', (str(path))))
+                self.undobuffer.append(action)
+            elif action[0] == "relabel":
+                registry, old_label, new_label, row_ids, added = action[1]
+                self.__relabel_rows(registry.column, row_ids, new_label)
+                registry.discard(old_label)
+                registry.add(new_label)
+                self.undobuffer.append(action)
+
+    def __push_pasted(self, parent_iter, sibling_iter, new_iters):
+        '''Pushes a "paste" undo entry for the rows at new_iters
+
+        The rows are packed as they ended up in the list, ids and all, so a
+        redo brings back exactly the same rows.
+        '''
+        row_data = []
+        self.__do_copy_real([self.tasklist.get_path(treeiter) for treeiter in new_iters], row_data)
+        parent_id = self.tasklist[parent_iter][20] if parent_iter is not None else None
+        sibling_id = self.tasklist[sibling_iter][20] if sibling_iter is not None else None
+        new_ids = [self.tasklist[treeiter][20] for treeiter in new_iters]
+        self.__push_undoable("paste", (parent_id, sibling_id, self.__pack_rows(row_data), new_ids))
+
+    def __pack_rows(self, rows, depth=0, packed=None):
+        '''Packs nested row data from __do_copy_real() for the undo history
+
+        Every row becomes a (depth, changes) pair in one flat tuple, with
+        parents ahead of their children. Changes are made by __pack_row(), so
+        an entry's size follows the data its rows actually hold.
+        '''
+        if packed is None: packed = []
+        for row in rows:
+            packed.append((depth, self.__pack_row(row)))
+            if row[-1]:
+                self.__pack_rows(row[-1], depth + 1, packed)
+        return tuple(packed) if depth == 0 else packed
+
+    def __unpack_rows(self, packed):
+        '''Rebuilds nested row data, as used by __do_paste_real(), from __pack_rows()'''
+
+        rows = []
+        levels = [rows] # the list that rows at each depth go into
+        for depth, changes in packed:
+            row = self.__unpack_row(changes)
+            row.append([])
+            del levels[depth + 1:]
+            levels[depth].append(row)
+            levels.append(row[-1])
+        return rows
+
+    def __pack_row(self, row):
+        '''Returns the (column, value) pairs where row differs from self.defaults'''
+
+        return tuple((col, row[col]) for col, default in enumerate(self.defaults) if row[col] != default)
+
+    def __unpack_row(self, changes):
+        '''Rebuilds a full row from the pairs made by __pack_row()'''
+
+        row = self.defaults[:]
+        for col, value in changes:
+            row[col] = value
+        return row
 
     def __push_undoable(self, action, data):
         '''Pushes a tuple onto the undobuffer list
@@ -1700,6 +2331,32 @@ class HiToDo(Gtk.Window):
         '''
         self.undobuffer.append((action, data))
         del self.redobuffer[:]
+        self.last_change_time = 0
+
+    def __push_change(self, path, field, old_val, new_val):
+        '''Pushes a "change" undo entry for one field of the row at path
+
+        Nothing is pushed if the value didn't change. An edit to the same row
+        and field as the newest entry, made within CHANGE_MERGE_TIME seconds of
+        the previous one, is folded into that entry so the whole burst undoes
+        in one step. If the burst ends on the value it started from, the entry
+        is dropped.
+        '''
+        if old_val == new_val: return
+
+        row_id = self.tasklist[path][20]
+        now = time()
+        if now - self.last_change_time < self.CHANGE_MERGE_TIME:
+            last = self.undobuffer.peek()
+            if last is not None and last[0] == "change" and last[1][:2] == (row_id, field):
+                self.undobuffer.pop()
+                old_val = last[1][2]
+                if old_val == new_val:
+                    self.last_change_time = 0
+                    return
+
+        self.__push_undoable("change", (row_id, field, old_val, new_val))
+        self.last_change_time = now
 
     def display_columns(self, cols=None):
         '''Clears the currently displayed columns and loads the ones in
@@ -1759,7 +2416,7 @@ class HiToDo(Gtk.Window):
             self.del_current_task()
             return True
         if kvn == "F2":
-            path = self.tasklist.get_path(self.seliter)
+            path = self.__list_to_view(self.tasklist.get_path(self.seliter))
             self.task_view.set_cursor_on_cell(path, self.col_title, self.title_cell, True)
             return True
         # NOTE We can override the spacebar to always mark/unmark our Done flag, but this breaks keyboard navigation
@@ -1805,8 +2462,7 @@ class HiToDo(Gtk.Window):
 
         self.label_edit_dlg.set_title("Manage Assigners (From)")
         self.label_edit_dlg.set_frame_label("Manage Assigners")
-        self.label_edit_dlg.set_store(self.assigners)
-        self.label_edit_dlg.set_list(self.assigners_list)
+        self.label_edit_dlg.set_registry(self.assigners)
         self.label_edit_dlg.set_instructions("Assigners", "From")
         self.label_edit_dlg.set_pref('default-from')
         ret = self.label_edit_dlg.show_all()
@@ -1816,8 +2472,7 @@ class HiToDo(Gtk.Window):
 
         self.label_edit_dlg.set_title("Manage Assignees (To)")
         self.label_edit_dlg.set_frame_label("Manage Assignees")
-        self.label_edit_dlg.set_store(self.assignees)
-        self.label_edit_dlg.set_list(self.assignees_list)
+        self.label_edit_dlg.set_registry(self.assignees)
         self.label_edit_dlg.set_instructions("Assignees", "To")
         self.label_edit_dlg.set_pref('default-to')
         ret = self.label_edit_dlg.run()
@@ -1827,21 +2482,184 @@ class HiToDo(Gtk.Window):
 
         self.label_edit_dlg.set_title("Manage Status Labels")
         self.label_edit_dlg.set_frame_label("Manage Status Labels")
-        self.label_edit_dlg.set_store(self.statii)
-        self.label_edit_dlg.set_list(self.statii_list)
+        self.label_edit_dlg.set_registry(self.statii)
         self.label_edit_dlg.set_instructions("Status labels", "Status")
         self.label_edit_dlg.set_pref('default-status')
         ret = self.label_edit_dlg.run()
 
-    def main_filter(self, model, treeiter, data=None):
-        '''Task list filtering function'''
+    def relabel(self, registry, old_label, new_label):
+        '''Renames a label in registry and on every task which carries it
 
-        # TODO implement me
-        return True
+        If new_label is already in the registry, the two labels are merged.
+        If it is blank, old_label is deleted and its tasks are left without
+        one. The affected rows come from the registry's row index, so tasks
+        with other labels are never visited, and the whole change is a single
+        undo entry.
+        '''
+        if not old_label or old_label == new_label: return
+
+        row_ids = tuple(registry.rows(old_label))
+        added = new_label not in registry and new_label != ''
+        self.__relabel_rows(registry.column, row_ids, new_label)
+        registry.discard(old_label)
+        registry.add(new_label)
+
+        #push "relabel" undo
+        self.__push_undoable("relabel", (registry, old_label, new_label, row_ids, added))
+
+    def __relabel_rows(self, column, row_ids, label):
+        '''Sets column to label in every row in row_ids, as one bulk edit'''
+
+        with self.bulk_edit(detach=len(row_ids) > self.BULK_VIEW_LIMIT):
+            for row_id in row_ids:
+                self.tasklist.set_value(self.row_ids[row_id], column, label)
+
+    def pick_filter(self, widget=None):
+        '''Filters the task list by the criteria picked in the filter dialog'''
+
+        if self.filter_dlg is None:
+            self.filter_dlg = dialogs.filterpicker.main(self)
+        else:
+            self.filter_dlg.update()
+
+        task_filter = self.filter_dlg.go()
+        if task_filter is not False:
+            self.set_filter(task_filter)
+
+    def clear_filter(self, widget=None):
+        '''Shows every task again'''
+
+        self.set_filter(None)
+
+    def set_filter(self, task_filter):
+        '''Shows only the tasks picked by task_filter, or all of them if None
+
+        Visibility is worked out once for the whole list and stored in a hidden
+        column, which a Gtk.TreeModelFilter reads without calling back into
+        Python. From then on, only rows which change are re-evaluated. While no
+        filter is on, the view shows self.tasklist itself and none of this
+        costs anything.
+        '''
+        state = self.__detach_view()
+
+        for handler in self.filter_handlers:
+            self.tasklist.disconnect(handler)
+        self.filter_handlers = []
+
+        if self.task_filter is None and state is not None:
+            #the filtered view starts fully expanded, so keep our own expansion for later
+            self.unfiltered_expanded = state[1]
+        if task_filter is None and self.task_filter is not None and state is not None:
+            state = state[:1] + (self.unfiltered_expanded,) + state[2:]
+
+        self.task_filter = task_filter
+        if task_filter is None:
+            self.tasklist_filter = None
+            model = self.tasklist
+        else:
+            with self.__filter_writes():
+                task_filter.apply(self.tasklist)
+            self.tasklist_filter = self.tasklist.filter_new()
+            self.tasklist_filter.set_visible_column(taskfilter.VISIBLE_COL)
+            model = self.tasklist_filter
+            self.filter_handlers = [
+                self.tasklist.connect("row-changed", self.__filter_row_changed),
+                self.tasklist.connect("row-inserted", self.__filter_row_inserted),
+                self.tasklist.connect("row-deleted", self.__filter_row_deleted)
+            ]
+
+        if state is not None:
+            self.__attach_view((model,) + state[1:])
+            if task_filter is not None:
+                self.task_view.expand_all()
+
+    @contextmanager
+    def __filter_writes(self):
+        '''Keeps visibility changes from counting as edits or being filtered again'''
+
+        self.filter_busy = True
+        for handler in self.dirty_handlers:
+            self.tasklist.handler_block(handler)
+        self.search_index.block()
+        try:
+            yield
+        finally:
+            self.search_index.unblock()
+            for handler in self.dirty_handlers:
+                self.tasklist.handler_unblock(handler)
+            self.filter_busy = False
+
+    def __filter_row_changed(self, model, path, treeiter):
+        if self.filter_busy: return
+        with self.__filter_writes():
+            self.task_filter.update(model, treeiter)
+
+    def __filter_row_inserted(self, model, path, treeiter):
+        '''New rows are always shown, along with their parents, until they change'''
+
+        if self.filter_busy: return
+        with self.__filter_writes():
+            if not model.get_value(treeiter, taskfilter.VISIBLE_COL):
+                model.set_value(treeiter, taskfilter.VISIBLE_COL, True)
+            taskfilter.show_ancestors(model, treeiter)
+
+    def __filter_row_deleted(self, model, path):
+        '''Our parent may have lost its only visible child'''
+
+        if self.filter_busy or path.get_depth() < 2: return
+        parent_path = path.copy()
+        parent_path.up()
+        with self.__filter_writes():
+            self.task_filter.update(model, model.get_iter(parent_path))
+
+    def __list_path(self, path):
+        '''Converts a path in the task view's model to one in self.tasklist
+
+        The two differ while a filter is on. Strings stay strings.
+        '''
+        if path is None or self.tasklist_filter is None: return path
+        list_path = self.tasklist_filter.convert_path_to_child_path(Gtk.TreePath(path))
+        return list_path.to_string() if isinstance(path, basestring) else list_path
+
+    def __list_to_view(self, path):
+        '''Converts a path in self.tasklist to one in the task view's model
+
+        Returns None if the row is filtered out.
+        '''
+        if path is None or self.tasklist_filter is None: return path
+        return self.tasklist_filter.convert_child_path_to_path(Gtk.TreePath(path))
+
+    def __from_view(self, handler, arg=0):
+        '''Wraps a cell renderer signal handler so it gets self.tasklist paths
+
+        arg is the position of the path among the signal's arguments, not
+        counting the renderer.
+        '''
+        def convert(renderer, *args):
+            args = list(args)
+            args[arg] = self.__list_path(args[arg])
+            return handler(renderer, *args)
+        return convert
+
+    def __select_row(self, treeiter, expand=False):
+        '''Selects only the row at treeiter, if the task view shows it'''
+
+        self.selection.unselect_all()
+        path = self.__list_to_view(self.tasklist.get_path(treeiter))
+        if path is None: return
+        if expand:
+            self.task_view.expand_to_path(path)
+        self.selection.select_path(path)
 
     def archive_done(self, widget, data=None):
-        '''Saves top-level done tasks (and descendents) to a separate archive
-        file, then deletes them'''
+        '''Saves done tasks (and descendents) to a separate archive file, then
+        deletes them
+
+        Every done task whose parent is still open is archived, no matter how
+        deep it is. The tasks are found in a single pass, written to the
+        archive in one batch, and then removed in one batch with
+        __remove_rows(), which also updates their ancestors.
+        '''
 
         # show the export dialog
         dlg = dialogs.misc.htd_warn_archive(self)
@@ -1855,27 +2673,16 @@ class HiToDo(Gtk.Window):
             bits = splitext(self.file_name)
             archive_path = bits[0]+'_archive'+bits[1]
 
-            # disable signals while we make big changes to the model
-            self.task_view.freeze_child_notify()
-
-            # set up a filter for our Done entries
-            archive_filter = self.tasklist.filter_new(None)
-            archive_filter.set_visible_column(12)
+            roots = self.__done_roots()
+            if not roots: return True
 
-            # append to the selected file
-            self.__do_save(archive_path, archive_filter, True)
-            del archive_filter
+            # append to the archive file, and only let go of our rows once they're safe
+            if not self.__do_save(archive_path, self.tasklist, True, roots=roots, wait=True):
+                return False
 
-            # remove rows from the main file
-            treeiter = self.tasklist.get_iter_first()
-            while treeiter is not None:
-                if self.tasklist[treeiter][12] is True:
-                    self.tasklist.remove(treeiter)
-                else:
-                    treeiter = self.tasklist.iter_next(treeiter)
+            # remove rows from the main file without redrawing for each one
+            self.__remove_rows(roots)
 
-            #start sending signals again and take focus
-            self.task_view.thaw_child_notify()
             self.task_view.grab_focus()
 
             #clear undo and redo buffers
@@ -1889,6 +2696,22 @@ class HiToDo(Gtk.Window):
             #cancel or any other code (like from esc key)
             return False
 
+    def __done_roots(self, parent_iter=None):
+        '''Returns iters for the done rows below parent_iter whose parents are not done
+
+        Done rows are not searched any further, since their children are done
+        as well.
+        '''
+        roots = []
+        treeiter = self.tasklist.iter_children(parent_iter)
+        while treeiter is not None:
+            if self.tasklist[treeiter][12]:
+                roots.append(treeiter)
+            elif self.tasklist.iter_has_child(treeiter):
+                roots += self.__done_roots(treeiter)
+            treeiter = self.tasklist.iter_next(treeiter)
+        return roots
+
     def toggle_toolbar(self, widget=None, event=None):
         '''Toggles visibility of the toolbar'''
 
@@ -1933,17 +2756,35 @@ class HiToDo(Gtk.Window):
             str,    #notes
             bool,   #use due time
             bool,   #inverted done flag
-            bool    #whether this row's spent time is currently tracked
+            bool,   #whether this row's spent time is currently tracked
+            int,    #leaf tasks in this subtree, or 1 for a leaf (hidden)
+            int,    #done leaf tasks in this subtree (hidden)
+            int,    #unique row id, see self.row_ids (hidden)
+            bool    #shown while the list is filtered, see set_filter() (hidden)
         )
         self.tasklist.set_sort_func(4, self.datecompare, None)
         self.tasklist.set_sort_func(5, self.datecompare, None)
         self.tasklist.set_sort_func(6, self.datecompare, None)
         self.tasklist.set_sort_func(7, self.datecompare, None)
         self.tasklist.set_sort_func(8, self.datecompare, None)
-        self.tasklist.connect("row-changed", self.make_dirty)
-        self.tasklist.connect("row-deleted", self.make_dirty)
-        self.tasklist_filter = self.tasklist.filter_new()
-        self.tasklist_filter.set_visible_func(self.main_filter)
+        self.dirty_handlers = [
+            self.tasklist.connect("row-changed", self.make_dirty),
+            self.tasklist.connect("row-deleted", self.make_dirty)
+        ]
+        self.bulk_depth = 0
+        self.dirty_generation = 0 #bumped by every make_dirty()
+        self.save_thread = None
+        self.save_result = None #(ok, generation) left by the save thread
+        self.row_ids = {} #row id -> Gtk.TreeIter, iters persist in a TreeStore
+        self.last_row_id = 0
+        self.notes = {} #row id -> full note text, column 14 only holds a preview
+        self.date_cache = {} #(datetime, use time) -> string, see date_render()
+        self.work_cache = {} #seconds -> string, see work_render()
+        self.tasklist_filter = None #only exists while a filter is on, see set_filter()
+        self.task_filter = None
+        self.filter_handlers = []
+        self.filter_busy = False
+        self.unfiltered_expanded = []
 
         self.defaults = [
             5,      #default priority
@@ -1963,23 +2804,25 @@ class HiToDo(Gtk.Window):
             "",     #notes
             False,  #use due time
             True,   #inverted done
-            False   #spent tracked
+            False,  #spent tracked
+            1,      #leaf tasks
+            0,      #done leaf tasks
+            0,      #row id, assigned on insert
+            True    #shown while filtered
         ]
 
         self.work_cols = {
             'est': 2,
             'spent': 3
         }
-
-        self.assigners = Gtk.ListStore(str)
-        self.assigners.set_sort_column_id(0, Gtk.SortType.ASCENDING)
-        self.assigners_list = []
-        self.assignees = Gtk.ListStore(str)
-        self.assignees.set_sort_column_id(0, Gtk.SortType.ASCENDING)
-        self.assignees_list = []
-        self.statii = Gtk.ListStore(str)
-        self.statii.set_sort_column_id(0, Gtk.SortType.ASCENDING)
-        self.statii_list = []
+        self.rollup_batch = None
+
+        self.assigners = labels.LabelRegistry(self.tasklist, 9)
+        self.assignees = labels.LabelRegistry(self.tasklist, 10)
+        self.statii = labels.LabelRegistry(self.tasklist, 11)
+        self.search_index = searchindex.SearchIndex(self.tasklist, self.notes)
+        #indexes kept current by the store's signals, see __forget_rows()
+        self.row_indexes = (self.assigners, self.assignees, self.statii, self.search_index)
         self.seliter = None
         self.sellist = None
         self.selcount = 0
@@ -1999,12 +2842,18 @@ class HiToDo(Gtk.Window):
         self.copied_rows = []
         self.cols_available = {}
         self.cols = Gtk.ListStore(str, str, bool, bool) #code, label for settings screen, visible flag, can hide flag
-        self.undobuffer = []
-        self.redobuffer = []
         self.maximized = False
 
         #construct settings object and changed::* bindings
         self.settings = settings.settings(self)
+
+        #undo and redo share their copies of long notes
+        undo_entries = self.settings.get("undo-max-entries")
+        undo_bytes = self.settings.get("undo-max-bytes")
+        blobs = {}
+        self.undobuffer = undobuffer.UndoHistory(undo_entries, undo_bytes, blobs)
+        self.redobuffer = undobuffer.UndoHistory(undo_entries, undo_bytes, blobs)
+        self.last_change_time = 0 #when the newest undo entry was pushed by __push_change()
         self.cols_visible = self.settings.get("default-columns")
 
         #create action groups
@@ -2038,7 +2887,7 @@ class HiToDo(Gtk.Window):
         task_scroll_win.set_hexpand(True)
         task_scroll_win.set_vexpand(True)
         self.task_view = Gtk.TreeView()
-        self.task_view.set_model(self.tasklist_filter)
+        self.task_view.set_model(self.tasklist)
 
         #set up columns
         self.create_columns()
@@ -2073,7 +2922,7 @@ class HiToDo(Gtk.Window):
         notes_scroll_win = Gtk.ScrolledWindow()
         notes_scroll_win.set_hexpand(True)
         notes_scroll_win.set_vexpand(True)
-        self.notes_buff = undobuffer.UndoableTextBuffer()
+        self.notes_buff = undobuffer.UndoableTextBuffer(undo_bytes) #same cap as the task history
         self.notes_view = Gtk.TextView()
         self.notes_view.set_buffer(self.notes_buff)
         self.notes_view.connect('focus-in-event', self.track_focus)
@@ -2088,6 +2937,43 @@ class HiToDo(Gtk.Window):
         notes_box.add(notes_scroll_win)
         self.task_pane.pack2(notes_box, True, True)
 
+        #add the search bar, which stays hidden until needed
+        self.search_bar = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.search_bar.set_property("margin", 3)
+
+        search_lbl = Gtk.Label()
+        search_lbl.set_text_with_mnemonic("F_ind:")
+        self.search_bar.pack_start(search_lbl, False, False, 0)
+
+        self.search_entry = Gtk.Entry()
+        self.search_entry.set_icon_from_stock(Gtk.EntryIconPosition.PRIMARY, Gtk.STOCK_FIND)
+        self.search_entry.connect("changed", self.search_changed)
+        self.search_entry.connect("activate", self.find_next)
+        self.search_entry.connect("key-press-event", self.search_keys_dn)
+        search_lbl.set_mnemonic_widget(self.search_entry)
+        self.search_bar.pack_start(self.search_entry, False, False, 0)
+
+        prevbtn = Gtk.Button(Gtk.STOCK_GO_UP)
+        prevbtn.set_use_stock(True)
+        prevbtn.connect("clicked", self.find_prev)
+        self.search_bar.pack_start(prevbtn, False, False, 0)
+
+        nextbtn = Gtk.Button(Gtk.STOCK_GO_DOWN)
+        nextbtn.set_use_stock(True)
+        nextbtn.connect("clicked", self.find_next)
+        self.search_bar.pack_start(nextbtn, False, False, 0)
+
+        self.search_count = Gtk.Label()
+        self.search_bar.pack_start(self.search_count, False, False, 0)
+
+        closebtn = Gtk.Button(Gtk.STOCK_CLOSE)
+        closebtn.set_use_stock(True)
+        closebtn.set_relief(Gtk.ReliefStyle.NONE)
+        closebtn.connect("clicked", self.hide_search)
+        self.search_bar.pack_end(closebtn, False, False, 0)
+
+        main_box.pack_start(self.search_bar, False, False, 0)
+
         #commit the task editing pane
         main_box.pack_start(self.task_pane, True, True, 0)
 
@@ -2102,6 +2988,7 @@ class HiToDo(Gtk.Window):
 
         # now we can hide or show the toolbar as desired
         self.toolbar.set_visible(self.settings.get("show-toolbar"))
+        self.search_bar.set_visible(False)
 
         # set up our dialogs
         self.open_dlg = dialogs.misc.htd_open(self)
@@ -2112,6 +2999,7 @@ class HiToDo(Gtk.Window):
         # create as needed later
         self.about_dlg = None
         self.colpicker_dlg = None
+        self.filter_dlg = None
 
         # if a filename was given on the command line, open it
         if len(sys.argv) >= 2:
@@ -2127,14 +3015,19 @@ class HiToDo(Gtk.Window):
     def date_render(self, col, cell, model, tree_iter, data):
         '''Renders date cells
 
-        Converts datetime objects from the tasklist model to displayable strings.
+        Converts datetime objects from the tasklist model to displayable
+        strings. Formatted strings are cached by value and format, so most
+        draws are a single dict lookup.
         '''
-        val = model[tree_iter][data]
-        duetime = model[tree_iter][15]
-
-        fmt = "%x %X" if duetime else "%x"
-        out = "" if val is "" else val.strftime(fmt)
-        cell.set_property("text", str(out))
+        key = model.get(tree_iter, data, 15) #value, use due time
+        try:
+            out = self.date_cache[key]
+        except KeyError:
+            val, duetime = key
+            fmt = "%x %X" if duetime else "%x"
+            out = "" if val == "" else str(val.strftime(fmt))
+            self.__cache_render(self.date_cache, key, out)
+        cell.set_property("text", out)
 
     def datecompare(self, model, row1, row2, data=None):
         '''Sorts date cells
@@ -2157,41 +3050,49 @@ class HiToDo(Gtk.Window):
     def title_render(self, col, cell, model, tree_iter, data):
         '''Render title and notes together
 
-        Eliminates line breaks in notes so that no task entry takes up multiple lines.
+        Column 14 holds a short single-line preview of the notes (see
+        tools.note_preview()), so no task entry takes up multiple lines.
         '''
         text = model[tree_iter][13]
         notes = model[tree_iter][14]
-        out = escape(text) if notes == '' else "%s  <span color=\"#999\">[%s]</span>" % (escape(text), escape(notes.replace(linesep, ' ')))
+        out = escape(text) if notes == '' else "%s  <span color=\"#999\">[%s]</span>" % (escape(text), escape(notes))
         cell.set_property("markup", out)
 
     def work_render(self, col, cell, model, tree_iter, data):
         '''Render est and spent cells
 
-        Converts stored seconds into hours or minutes with a suffix.
+        Converts stored seconds into hours or minutes with a suffix. Like
+        date_render(), results are cached by value.
         '''
-        val = model[tree_iter][data]
-
-        if val == 0:
-            out = ''
-            tip = '';
-        else:
-            minutes = '%im' % round(val / 60)
-            hours = '%1.2fh' % (val/3600)
-            days = '%1.2fd' % (val/86400)
-            if val < 3600:
-                out = minutes
+        val = model.get_value(tree_iter, data)
+        try:
+            out = self.work_cache[val]
+        except KeyError:
+            if val == 0:
+                out = ''
+            elif val < 3600:
+                out = '%im' % round(val / 60)
             else:
-                out = hours
-            tip = "Minutes: "+minutes+"\nHours: "+hours+"\nDays: "+days
-            # TODO use this for tooltip text, somehow
+                out = '%1.2fh' % (val/3600)
+            self.__cache_render(self.work_cache, val, out)
         cell.set_property("text", out)
 
+    def __cache_render(self, cache, key, out):
+        '''Stores a formatted cell value, emptying cache first if it is full
+
+        The caches are keyed by the values themselves, so row changes never
+        make an entry stale. They only need a bound.
+        '''
+        if len(cache) >= self.RENDER_CACHE_SIZE:
+            cache.clear()
+        cache[key] = out
+
     def create_columns(self):
         '''Creates the columns used by the task list view'''
 
         priority = Gtk.CellRendererText(editable=True, foreground="#999")
-        priority.connect("edited", self.commit_priority)
-        priority.connect("editing-started", self.priority_edit_start)
+        priority.connect("edited", self.__from_view(self.commit_priority))
+        priority.connect("editing-started", self.__from_view(self.priority_edit_start, 1))
         col_priority = Gtk.TreeViewColumn("!", priority, text=0, foreground_set=12)
         col_priority.set_sort_column_id(0)
         col_priority.set_reorderable(True)
@@ -2208,8 +3109,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['pct complete', 'Percent Complete (%)', True, True])
 
         est = Gtk.CellRendererText(foreground="#999", editable=True)
-        est.connect("edited", self.save_work, 'est')
-        est.connect("editing-started", self.duration_edit_start, 2)
+        est.connect("edited", self.__from_view(self.save_work), 'est')
+        est.connect("editing-started", self.__from_view(self.duration_edit_start, 1), 2)
         col_est = Gtk.TreeViewColumn("Est", est, foreground_set=12)
         col_est.set_reorderable(True)
         col_est.set_sort_column_id(2)
@@ -2219,8 +3120,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['time est', 'Est', True, True])
 
         spent = Gtk.CellRendererText(foreground="#999", editable=True)
-        spent.connect("edited", self.save_work, 'spent')
-        spent.connect("editing-started", self.duration_edit_start, 3)
+        spent.connect("edited", self.__from_view(self.save_work), 'spent')
+        spent.connect("editing-started", self.__from_view(self.duration_edit_start, 1), 3)
         col_spent = Gtk.TreeViewColumn("Spent", spent, foreground_set=12)
         col_spent.set_reorderable(True)
         col_spent.set_sort_column_id(3)
@@ -2237,8 +3138,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['tracked', u'Tracking (\u231A)', True, True])
 
         est_begin = widgets.CellRendererDate(editable=True, foreground="#999")
-        est_begin.connect("edited", self.commit_date, 4)
-        est_begin.connect("editing-started", self.date_edit_start)
+        est_begin.connect("edited", self.__from_view(self.commit_date), 4)
+        est_begin.connect("editing-started", self.__from_view(self.date_edit_start, 1))
         col_est_begin = Gtk.TreeViewColumn("Est Begin", est_begin, foreground_set=12)
         col_est_begin.set_reorderable(True)
         col_est_begin.set_sort_column_id(4)
@@ -2248,8 +3149,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['est begin', 'Est Begin', False, True])
 
         est_complete = widgets.CellRendererDate(editable=True, foreground="#999")
-        est_complete.connect("edited", self.commit_date, 5)
-        est_complete.connect("editing-started", self.date_edit_start)
+        est_complete.connect("edited", self.__from_view(self.commit_date), 5)
+        est_complete.connect("editing-started", self.__from_view(self.date_edit_start, 1))
         col_est_complete = Gtk.TreeViewColumn("Est Complete", est_complete, foreground_set=12)
         col_est_complete.set_reorderable(True)
         col_est_complete.set_sort_column_id(5)
@@ -2259,8 +3160,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['est complete', 'Est Complete', False, True])
 
         due = widgets.CellRendererDate(editable=True, foreground="#999")
-        due.connect("edited", self.commit_date, 8)
-        due.connect("editing-started", self.date_edit_start)
+        due.connect("edited", self.__from_view(self.commit_date), 8)
+        due.connect("editing-started", self.__from_view(self.date_edit_start, 1))
         col_due = Gtk.TreeViewColumn("Due", due, foreground_set=12)
         col_due.set_reorderable(True)
         col_due.set_sort_column_id(8)
@@ -2270,8 +3171,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['due date', 'Due', True, True])
 
         act_begin = widgets.CellRendererDate(editable=True, foreground="#999")
-        act_begin.connect("edited", self.commit_date, 6)
-        act_begin.connect("editing-started", self.date_edit_start)
+        act_begin.connect("edited", self.__from_view(self.commit_date), 6)
+        act_begin.connect("editing-started", self.__from_view(self.date_edit_start, 1))
         col_act_begin = Gtk.TreeViewColumn("Begin", act_begin, foreground_set=12)
         col_act_begin.set_reorderable(True)
         col_act_begin.set_sort_column_id(6)
@@ -2281,8 +3182,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['act begin', 'Begin', False, True])
 
         completed = widgets.CellRendererDate(editable=True, foreground="#999")
-        completed.connect("edited", self.commit_date, 7)
-        completed.connect("editing-started", self.date_edit_start)
+        completed.connect("edited", self.__from_view(self.commit_date), 7)
+        completed.connect("editing-started", self.__from_view(self.date_edit_start, 1))
         col_completed = Gtk.TreeViewColumn("Completed", completed, foreground_set=12, visible=12)
         col_completed.set_reorderable(True)
         col_completed.set_sort_column_id(7)
@@ -2292,8 +3193,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['complete date', 'Completed', True, True])
 
         assigner = Gtk.CellRendererText(editable=True, foreground="#999")
-        assigner.connect("edited", self.commit_assigner)
-        assigner.connect("editing-started", self.list_edit_start, self.assigners)
+        assigner.connect("edited", self.__from_view(self.commit_assigner))
+        assigner.connect("editing-started", self.__from_view(self.list_edit_start, 1), self.assigners.store)
         col_assigner = Gtk.TreeViewColumn("From", assigner, text=9, foreground_set=12)
         col_assigner.set_reorderable(True)
         col_assigner.set_sort_column_id(9)
@@ -2302,8 +3203,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['from', 'From', True, True])
 
         assignee = Gtk.CellRendererText(editable=True, foreground="#999")
-        assignee.connect("edited", self.commit_assignee)
-        assignee.connect("editing-started", self.list_edit_start, self.assignees)
+        assignee.connect("edited", self.__from_view(self.commit_assignee))
+        assignee.connect("editing-started", self.__from_view(self.list_edit_start, 1), self.assignees.store)
         col_assignee = Gtk.TreeViewColumn("To", assignee, text=10, foreground_set=12)
         col_assignee.set_reorderable(True)
         col_assignee.set_sort_column_id(10)
@@ -2312,8 +3213,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['to', 'To', True, True])
 
         status = Gtk.CellRendererText(editable=True, foreground="#999")
-        status.connect("edited", self.commit_status)
-        status.connect("editing-started", self.list_edit_start, self.statii)
+        status.connect("edited", self.__from_view(self.commit_status))
+        status.connect("editing-started", self.__from_view(self.list_edit_start, 1), self.statii.store)
         col_status = Gtk.TreeViewColumn("Status", status, text=11, foreground_set=12)
         col_status.set_reorderable(True)
         col_status.set_sort_column_id(11)
@@ -2322,7 +3223,7 @@ class HiToDo(Gtk.Window):
         self.cols.append(['status', 'Status', True, True])
 
         done = Gtk.CellRendererToggle(activatable=True, radio=False)
-        done.connect("toggled", self.commit_done)
+        done.connect("toggled", self.__from_view(self.commit_done))
         col_done = Gtk.TreeViewColumn(u"\u2713", done, active=12)
         col_done.set_sort_column_id(12)
         col_done.set_reorderable(True)
@@ -2331,8 +3232,8 @@ class HiToDo(Gtk.Window):
         self.cols.append(['done', u'Done (\u2713)', True, False])
 
         self.title_cell = Gtk.CellRendererText(editable=True, ellipsize=Pango.EllipsizeMode.MIDDLE, foreground="#999")
-        self.title_cell.connect("edited", self.commit_title)
-        self.title_cell.connect("editing-started", self.title_edit_start)
+        self.title_cell.connect("edited", self.__from_view(self.commit_title))
+        self.title_cell.connect("editing-started", self.__from_view(self.title_edit_start, 1))
         self.title_cell.connect("editing-canceled", self.commit_title, None, None)
         self.col_title = Gtk.TreeViewColumn("Title")
         self.col_title.pack_start(self.title_cell, True)
@@ -2404,7 +3305,12 @@ class HiToDo(Gtk.Window):
             ("expand_all", None, "_Expand All", None, "Expand all tasks", self.expand_all),
             ("collapse_all", None, "_Collapse All", None, "Collapse all tasks", self.collapse_all),
             ("swap_focus", None, "Swap _Focus", "F11", "Change focus between Tasks and Comments", self.swap_focus),
-            ("pick_cols", None, "_Show Columns...", None, "Choose which columns are visible", self.pick_cols)
+            ("pick_cols", None, "_Show Columns...", None, "Choose which columns are visible", self.pick_cols),
+            ("find", Gtk.STOCK_FIND, "_Find...", "<Primary>F", "Search task titles and comments", self.show_search),
+            ("find_next", None, "Find Ne_xt", "<Primary>G", "Go to the next matching task", self.find_next),
+            ("find_prev", None, "Find Pre_vious", "<Primary><Shift>G", "Go to the previous matching task", self.find_prev),
+            ("filter_tasks", None, "_Filter Tasks...", None, "Show only tasks which meet some criteria", self.pick_filter),
+            ("clear_filter", None, "Show _All Tasks", None, "Stop filtering the task list", self.clear_filter)
         ])
 
         self.task_del = Gtk.Action("task_del", "Delete task", "Delete selected task(s)", Gtk.STOCK_REMOVE)
@@ -2466,6 +3372,7 @@ class HiToDo(Gtk.Window):
         '''Shows the 'confirm discard' dialog before closing, if applicable'''
 
         if not self.confirm_discard(): return True
+        self.wait_for_save()
         self.settings.save_prefs()
         Gtk.main_quit()
 
@@ -2476,5 +3383,6 @@ def main():
     return
 
 if __name__ == "__main__":
+    GObject.threads_init() #saves are written on their own thread
     htd = HiToDo()
     main()
@@ -17,4 +17,5 @@
 
 import misc
 import labeledit
-import colpicker
\ No newline at end of file
+import colpicker
+import filterpicker
@@ -0,0 +1,117 @@
+# Copyright 2013 Peter Andrews
+
+# This file is part of HiToDo.
+#
+# HiToDo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HiToDo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gtk
+from datetime import datetime, timedelta
+import taskfilter
+
+class main(Gtk.Dialog):
+    '''Picks the criteria for filtering the task list'''
+
+    def __init__(self, parent):
+        '''Lay out one row of widgets per criterion'''
+
+        #handle dialog init
+        flags = Gtk.DialogFlags.DESTROY_WITH_PARENT
+        Gtk.Dialog.__init__(self, "Filter Tasks", parent, flags)
+        self.add_button("Show _All", Gtk.ResponseType.REJECT)
+        self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        self.add_button(Gtk.STOCK_OK, Gtk.ResponseType.OK)
+        self.set_default_response(Gtk.ResponseType.OK)
+        content = self.get_content_area()
+        self.parent = parent
+
+        grid = Gtk.Grid()
+        grid.set_column_spacing(5)
+        grid.set_row_spacing(5)
+        grid.set_property("margin", 6)
+
+        #assignee and status pick from the list's own labels
+        self.assignee = Gtk.ComboBoxText()
+        grid.attach(Gtk.Label("Assigned to:", xalign=0), 0, 0, 1, 1)
+        grid.attach(self.assignee, 1, 0, 3, 1)
+
+        self.status = Gtk.ComboBoxText()
+        grid.attach(Gtk.Label("Status:", xalign=0), 0, 1, 1, 1)
+        grid.attach(self.status, 1, 1, 3, 1)
+
+        self.use_priority = Gtk.CheckButton.new_with_label("Priority from")
+        self.priority_min = Gtk.SpinButton.new_with_range(0, 99, 1)
+        self.priority_max = Gtk.SpinButton.new_with_range(0, 99, 1)
+        self.priority_max.set_value(9)
+        grid.attach(self.use_priority, 0, 2, 1, 1)
+        grid.attach(self.priority_min, 1, 2, 1, 1)
+        grid.attach(Gtk.Label("to"), 2, 2, 1, 1)
+        grid.attach(self.priority_max, 3, 2, 1, 1)
+
+        #overdue tasks are always within the window
+        self.use_due = Gtk.CheckButton.new_with_label("Due within")
+        self.due_days = Gtk.SpinButton.new_with_range(0, 3650, 1)
+        self.due_days.set_value(7)
+        grid.attach(self.use_due, 0, 3, 1, 1)
+        grid.attach(self.due_days, 1, 3, 1, 1)
+        grid.attach(Gtk.Label("days", xalign=0), 2, 3, 2, 1)
+
+        self.done = Gtk.ComboBoxText()
+        for label in ("Any", "Not done", "Done"):
+            self.done.append_text(label)
+        self.done.set_active(0)
+        grid.attach(Gtk.Label("Show:", xalign=0), 0, 4, 1, 1)
+        grid.attach(self.done, 1, 4, 3, 1)
+
+        content.pack_start(grid, True, True, 0)
+        self.update()
+        self.show_all()
+
+    def update(self):
+        '''Refill the label pickers from our parent's current label lists'''
+
+        for combo, labels in ((self.assignee, self.parent.assignees),
+                              (self.status, self.parent.statii)):
+            combo.remove_all()
+            combo.append_text("Any")
+            for label in sorted(labels):
+                combo.append_text(label)
+            combo.set_active(0)
+
+    def go(self):
+        '''Show ourselves and build a filter from the chosen criteria
+
+        Returns a taskfilter.TaskFilter, None to stop filtering, or False if
+        the dialog was canceled.
+        '''
+        ret = self.run()
+        self.hide()
+
+        if ret == Gtk.ResponseType.REJECT:
+            return None
+        if ret != Gtk.ResponseType.OK:
+            return False
+
+        task_filter = taskfilter.TaskFilter()
+        if self.assignee.get_active() > 0:
+            task_filter.assignees = set([self.assignee.get_active_text()])
+        if self.status.get_active() > 0:
+            task_filter.statii = set([self.status.get_active_text()])
+        if self.use_priority.get_active():
+            task_filter.priority = (self.priority_min.get_value_as_int(), self.priority_max.get_value_as_int())
+        if self.use_due.get_active():
+            task_filter.due = (None, datetime.now() + timedelta(days=self.due_days.get_value_as_int()))
+        if self.done.get_active() > 0:
+            task_filter.done = self.done.get_active() == 2
+
+        return task_filter if task_filter.is_active() else None
@@ -31,6 +31,7 @@ class main(Gtk.Dialog):
         self.set_name("htd_label_edit_dlg")
 
         #internal vars
+        self.registry = None
         self.treestore = None
         self.parent = parent
         self.name_edit_path = ""
@@ -103,7 +104,7 @@ class main(Gtk.Dialog):
         self.hide()
 
     def push_default(self, widget=None):
-        self.parent.settings.set(self.pref, self.label_list)
+        self.parent.settings.set(self.pref, self.registry.sorted())
         self.disappear()
 
     def show(self):
@@ -115,16 +116,15 @@ class main(Gtk.Dialog):
         lbl.set_use_markup(True)
         self.frame.set_label_widget(lbl)
 
-    def set_store(self, treestore):
-        self.treestore = treestore
+    def set_registry(self, registry):
+        '''Edit the labels in registry, a labels.LabelRegistry'''
+        self.registry = registry
+        self.treestore = registry.store
         self.view.set_model(self.treestore)
 
-    def set_list(self, label_list):
-        label_list.sort()
-        self.label_list = label_list
-
     def set_instructions(self, field, colname):
-        self.instructions.set_text("Choose which %s will appear in the %s dropdown list." % (field, colname))
+        self.instructions.set_text("Choose which %s will appear in the %s dropdown list. "
+            "Renaming or removing one also changes the tasks which use it." % (field, colname))
 
     def set_pref(self, pref):
         self.pref = pref
@@ -145,12 +145,11 @@ class main(Gtk.Dialog):
             seliter = self.treestore.get_iter(path)
 
         val = self.treestore[seliter][0]
-        if val is not None:
-            idex = self.label_list.index(val)
-            if idex is not None:
-                del self.label_list[idex]
-                self.parent.make_dirty()
-        self.treestore.remove(seliter)
+        if val:
+            #clears the label from its tasks too, and takes its row along
+            self.parent.relabel(self.registry, val, '')
+        else:
+            self.treestore.remove(seliter) #blank row from add_label()
 
     def commit_name(self, widget=None, path=None, new_name=None, write=True):
         if path is None:
@@ -177,10 +176,14 @@ class main(Gtk.Dialog):
                 return
 
         #finally, set the new name if allowed
+        #renaming to an existing label merges the two
         if write is True:
-            self.treestore[path][0] = new_name
-            self.label_list.append(new_name)
-            self.parent.make_dirty()
+            if old_name:
+                self.parent.relabel(self.registry, old_name, new_name)
+            else:
+                self.treestore.remove(self.treestore.get_iter(path))
+                self.registry.add(new_name)
+                self.parent.make_dirty()
 
     def name_edit_start(self, renderer, editor, path):
         self.name_edit_path = str(path)
@@ -52,7 +52,7 @@ class htd_warn_archive(Gtk.MessageDialog):
     def __init__(self, parent):
         flags = Gtk.DialogFlags.MODAL & Gtk.DialogFlags.DESTROY_WITH_PARENT
         Gtk.MessageDialog.__init__(self, parent, flags, Gtk.MessageType.WARNING, Gtk.ButtonsType.NONE, "Archive completed tasks?")
-        self.format_secondary_text("This will move all top-level completed tasks to an archive list. This action cannot be undone.")
+        self.format_secondary_text("This will move all completed tasks, including those under unfinished tasks, to an archive list. This action cannot be undone.")
         self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
         self.add_button(Gtk.STOCK_OK, Gtk.ResponseType.ACCEPT)
         self.set_default_response(Gtk.ResponseType.ACCEPT)
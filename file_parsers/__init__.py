@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
 
+import atomic
 import fileParser
 import htdl
 import xml_filter
\ No newline at end of file
@@ -0,0 +1,130 @@
+# Copyright 2013 Peter Andrews
+
+# This file is part of HiToDo.
+#
+# HiToDo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HiToDo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
+
+from contextlib import contextmanager
+from os.path import abspath, basename, dirname, exists, isfile
+from tempfile import mkstemp
+from shutil import copy2
+import os
+
+# umask can only be read by setting it, which is not safe once saves run on
+# their own thread, so it is read once at import
+_umask = os.umask(0)
+os.umask(_umask)
+
+@contextmanager
+def replace(filename, backups=0):
+    '''Opens a temporary file which replaces filename once it is complete
+
+    Usage:
+        with atomic.replace(filename) as f:
+            f.write(...)
+
+    The temporary file sits next to filename, so the final rename never
+    crosses file systems. It is synced to disk once when the block ends and
+    then renamed over filename, so a crash at any point leaves either the old
+    file or the new one, never a mix. If the block raises, the temporary file
+    is removed and filename is untouched.
+
+    Arguments:
+    filename - string - The file to write
+    backups - int - How many previous versions to keep as filename.1,
+                    filename.2, etc. The newest is always filename.1.
+
+    Failures are raised as IOError, as a plain open() and write() would, even
+    where the os module raised OSError.
+    '''
+    path = abspath(filename)
+    folder = dirname(path)
+    try:
+        (fd, temp_path) = mkstemp(prefix='.'+basename(path)+'.', suffix='.tmp', dir=folder)
+    except OSError as e:
+        raise _io_error(e)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp files are private, so keep the permissions a plain open() would give
+        if isfile(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0777)
+        else:
+            os.chmod(temp_path, 0666 & ~_umask)
+
+        if backups > 0:
+            rotate(path, backups)
+        os.rename(temp_path, path)
+    except OSError as e:
+        _discard(temp_path)
+        raise _io_error(e)
+    except:
+        _discard(temp_path)
+        raise
+
+    # make the rename itself durable
+    _sync_dir(folder)
+
+def rotate(path, backups):
+    '''Shifts path.1 through path.(backups-1) up by one and copies path to path.1
+
+    The oldest version falls off the end. path itself stays in place, so it can
+    still be replaced atomically afterwards. Hard links make the copy free where
+    the file system supports them.
+    '''
+    if not isfile(path): return
+
+    for n in range(backups - 1, 0, -1):
+        older = "%s.%d" % (path, n)
+        if exists(older):
+            os.rename(older, "%s.%d" % (path, n + 1))
+
+    newest = path + ".1"
+    if exists(newest):
+        os.remove(newest)
+    try:
+        os.link(path, newest)
+    except (OSError, AttributeError):
+        copy2(path, newest)
+
+def _discard(temp_path):
+    '''Removes an unfinished temporary file, if it is still there'''
+
+    try:
+        if exists(temp_path):
+            os.remove(temp_path)
+    except OSError:
+        pass
+
+def _io_error(err):
+    '''Returns an IOError with the details of the OSError err'''
+
+    return IOError(err.errno, err.strerror, err.filename)
+
+def _sync_dir(folder):
+    '''Flushes the directory entry changes in folder to disk, where possible'''
+
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -22,14 +22,47 @@ from xml.etree.ElementTree import SubElement
 from dateutil.parser import parse as dateparse
 from datetime import datetime
 from os.path import isfile
-from os import remove as osremove
-from tempfile import mkstemp
-import gzip
+from os import fsync
+from io import BytesIO
+from time import time
+from hashlib import sha1
+from functools import partial
 import tarfile
 
+import atomic
 import xml_filter
+import searchindex
+
+class _DigestReader(object):
+    '''Wraps a file object, taking the sha1 digest of everything read from it'''
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = sha1()
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        '''Returns the digest of the whole file, reading whatever is left of it'''
+
+        while self.read(65536): pass
+        return self.digest.hexdigest()
+
+    def close(self):
+        self.f.close()
 
 class FileFilter(xml_filter.FileFilter):
+    # tarfile modes and options for each value of the save-compression setting
+    compression_modes = {
+        'none': ('w', {}),
+        'fast': ('w:gz', {'compresslevel': 1}),
+        'gzip': ('w:gz', {'compresslevel': 9})
+    }
+    default_compression = 'fast'
+
     def __init__(self):
         Gtk.FileFilter.__init__(self)
         self.add_pattern("*.htdl")
@@ -39,16 +72,60 @@ class FileFilter(xml_filter.FileFilter):
         self.file_version = "1.0"
 
     def read_to_store(self, data):
-        '''Reads todo list data from tgz'd xml file. Data is a dictionary of data holders to fill.'''
-        with tarfile.open(data['filename'], 'r:gz') as tar:
-            tar = tarfile.open(data['filename'], 'r:gz')
-            f = tar.extractfile('todo.data')
+        '''Reads todo list data from a tar'd xml file. Data is a dictionary of data holders to fill.
+
+        The tar may be gzipped or not; tarfile works out which from the file itself.
+        Batches of tasks added by write_append() follow the first tar's
+        end-of-archive blocks, so those are skipped, and each batch's tasks are
+        added after the ones already read.
+
+        If the file holds a search index for its tasks, data['search_index']
+        is set to a function which loads it, see read_index(). The index
+        itself is only read when that is called.
+        '''
+        row_ids = data.get('row_ids')
+        first_id = (max(row_ids) if row_ids else 0) + 1 # parse_raw() numbers rows in order from here
+        with tarfile.open(data['filename'], 'r:*', ignore_zeros=True) as tar:
+            f = _DigestReader(tar.extractfile('todo.data'))
             self.parse_raw(f, data)
+            digest = f.hexdigest()
             f.close()
             v = tar.extractfile('version.data')
             data['save_version'] = v.readline().rstrip() # version is in its own file
             v.close()
 
+            indexed = appended = False
+            for member in tar.getmembers():
+                if member.name == 'append.data':
+                    f = tar.extractfile(member)
+                    self.parse_raw(f, data, True)
+                    f.close()
+                    appended = True
+                elif member.name == 'index.data':
+                    indexed = True
+
+        # archived batches are written without updating the index
+        if indexed and not appended:
+            data['search_index'] = partial(self.read_index, data['filename'], digest, first_id)
+
+    def read_index(self, filename, digest, first_id):
+        '''Loads the search index saved in an htdl file
+
+        digest is the sha1 hex digest of the todo.data the tasks were read
+        from, and first_id is the id given to the first of them. Returns what
+        searchindex.load_index() does, or None if the file can no longer be
+        read.
+        '''
+        try:
+            with tarfile.open(filename, 'r:*', ignore_zeros=True) as tar:
+                f = tar.extractfile('index.data')
+                try:
+                    return searchindex.load_index(f, digest, first_id)
+                finally:
+                    f.close()
+        except (tarfile.TarError, IOError, KeyError):
+            return None
+
     def write(self, data, append):
         if append is True and isfile(data['filename']):
             self.write_append(data)
@@ -57,53 +134,83 @@ class FileFilter(xml_filter.FileFilter):
 
     def write_simple(self, data):
         '''Writes todo list data to xml file. Data is a dictionary of data pieces to store.'''
-        # create tgz-formatted output file and write
-        with tarfile.open(data['filename'], 'w:gz') as tar:
-            # store xml in a temp file
-            (datafile, datafile_path) = mkstemp()
-            super(FileFilter, self).write_simple(data, datafile_path)
+        htd = self.make_document(data)
+        self.__write_tar(data, htd)
+
+    def write_append(self, data):
+        '''Appends tasks to an existing file without rewriting it. CAUTION: This function does not add or update anything besides tasks.
 
-            # store version in a temp file
-            (verfile, verfile_path) = mkstemp()
-            verfile = open(verfile_path, 'wb')
-            verfile.write(self.file_version)
-            verfile.close()
+        The tasks are stored in a tar of their own holding a single append.data
+        member, which is added to the end of the file using the same
+        compression as the rest of it. Gzip reads the result as one stream, so
+        the file stays a valid tar, and read_to_store() merges every batch.
+        Archiving thus costs the size of what is archived instead of the size
+        of the archive.
+        '''
+        htd = Element('htd')
+        htd.set('version', self.file_version)
+        tasklist = SubElement(htd, 'tasklist')
+        if 'tasks' not in data:
+            self.snapshot(data)
+        self.store_snapshot(data['tasks'], tasklist)
 
-            tar.add(datafile_path, arcname="todo.data")
-            tar.add(verfile_path, arcname="version.data")
+        # the new batch has to match the file's own compression
+        with open(data['filename'], 'rb') as f:
+            gzipped = f.read(2) == '\x1f\x8b'
+        if gzipped:
+            compression = data.get('compression')
+            if compression not in self.compression_modes or compression == 'none':
+                compression = self.default_compression
+        else:
+            compression = 'none'
+        mode, options = self.compression_modes[compression]
 
-            osremove(datafile_path)
-            osremove(verfile_path)
+        with open(data['filename'], 'ab') as f:
+            with tarfile.open(data['filename'], mode, f, **options) as tar:
+                self.__add_member(tar, "append.data", ElementTree.tostring(htd, encoding="UTF-8"))
+            f.flush()
+            fsync(f.fileno())
 
-    def write_append(self, data):
-        '''Appends tasks to an existing file. CAUTION: This function does not add or update anything besides tasks.'''
-        with tarfile.open(data['filename'], 'r:gz') as tar:
-            f = tar.extractfile('todo.data')
-            document = ElementTree.parse(f)
-            f.close()
+    def __write_tar(self, data, htd):
+        '''Writes the xml tree htd, our version, and a search index to a tar at data['filename']
+
+        The file is replaced atomically, keeping data['backups'] old versions.
+        The index covers the tasks in htd and carries the digest of todo.data,
+        so it is never used with any other tasks.
+
+        The data dict's 'compression' key picks an entry from
+        self.compression_modes. Plain tars cost no CPU to write, while gzip is
+        what older versions of HiToDo expect.
+        '''
+        compression = data.get('compression')
+        if compression not in self.compression_modes:
+            compression = self.default_compression
+        mode, options = self.compression_modes[compression]
+
+        todo = ElementTree.tostring(htd, encoding="UTF-8")
+        index = searchindex.dump_index(self.__row_words(data['tasks']), sha1(todo).hexdigest())
+
+        with atomic.replace(data['filename'], data.get('backups') or 0) as f:
+            # write every member straight from memory
+            with tarfile.open(data['filename'], mode, f, **options) as tar:
+                self.__add_member(tar, "todo.data", todo)
+                self.__add_member(tar, "version.data", self.file_version)
+                self.__add_member(tar, "index.data", index)
+
+    def __row_words(self, nodes, row_words=None):
+        '''Returns the set of words in the title and notes of every task in
+        nodes, from snapshot_tasks(), in document order
+        '''
+        if row_words is None: row_words = []
+        for values, children in nodes:
+            row_words.append(searchindex.words(values[13]) | searchindex.words(values[14]))
+            self.__row_words(children, row_words)
+        return row_words
+
+    def __add_member(self, tar, name, content):
+        '''Adds a file called name holding the string content to tar'''
 
-        htd = document.getroot()
-        tasklist = document.find("tasklist")
-        # TODO update the rest of the saved info
-        super(FileFilter, self).store_tasks(data['task_store'], tasklist)
-
-        #write to file
-        with tarfile.open(data['filename'], 'w:gz') as tar:
-            # store xml in a temp file
-            (datafile, datafile_path) = mkstemp()
-            datafile = open(datafile_path, 'wb')
-            datafile.write(ElementTree.tostring(htd, encoding="UTF-8"))
-            datafile.close()
- 
-            # store version in a temp file
-            (verfile, verfile_path) = mkstemp()
-            verfile = open(verfile_path, 'wb')
-            verfile.write(self.file_version)
-            verfile.close()
-
-            # create tgz-formatted output file and write
-            tar.add(datafile_path, arcname="todo.data")
-            tar.add(verfile_path, arcname="version.data")
-            tar.close()
-            osremove(datafile_path)
-            osremove(verfile_path)
+        info = tarfile.TarInfo(name)
+        info.size = len(content)
+        info.mtime = time()
+        tar.addfile(info, BytesIO(content))
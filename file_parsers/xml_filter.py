@@ -27,9 +27,13 @@ from tempfile import mkstemp
 import gzip
 import tarfile
 
+import atomic
 import xml_filter
+import tools
 
 class FileFilter(Gtk.FileFilter):
+    saved_cols = range(17) #columns copied by snapshot_tasks()
+
     def __init__(self):
         Gtk.FileFilter.__init__(self)
         self.add_pattern("*.xml")
@@ -37,6 +41,7 @@ class FileFilter(Gtk.FileFilter):
         self.file_extension = ".xml"
         self.tasklist = None
         self.file_version = "1.0"
+        self.__dates = {}
 
     def read_to_store(self, data, fname=None):
         '''Reads todo list data from xml file. Data is a dictionary of data holders to fill.'''
@@ -46,114 +51,184 @@ class FileFilter(Gtk.FileFilter):
         with open(fname, 'rb') as f:
             self.parse_raw(f, data)
 
-    def parse_raw(self, f, data):
-        document = ElementTree.parse(f)
+    def parse_raw(self, f, data, append=False):
+        '''Streams todo list data from the file object f into data
 
-        htd = document.getroot()
-        data['save_version'] = float(htd.get('version'))
-        data['our_version'] = self.file_version
+        Tasks are appended to data['task_store'] as soon as their elements are
+        complete and the elements are then thrown away, so memory use depends
+        on the depth of the task tree instead of the number of tasks. Every
+        row gets a fresh id in column 20 and is listed in data['row_ids'].
+        Notes go into data['notes'] under their row's id, and the rows only
+        hold a preview of them.
 
-        #get assigners, assignees, and statii lists
-        assigners = document.find("assigners")
-        for n in assigners.findall('name'):
-            if n.text not in data['from_list']:
-                data['from_list'].append(n.text)
-
-        assignees = document.find("assignees")
-        for n in assignees.findall('name'):
-            if n.text not in data['to_list']:
-                data['to_list'].append(n.text)
-
-        statii = document.find("statii")
-        for n in statii.findall('name'):
-            if n.text not in data['status_list']:
-                data['status_list'].append(n.text)
-
-        #get visible column list
-        columns = document.find('columns')
-        for c in columns.findall('col'):
-            data['cols'].append((c.text, c.attrib['visible'] == "True"))
-
-        #get window geometry
-        geo = document.find('geometry')
-        maxed = geo.find('maximized').text == "True"
-        height = int(geo.find('height').text)
-        width = int(geo.find('width').text)
-        task_width = int(geo.find('task-width').text)
-
-        data['geometry'] = (maxed, height, width, task_width)
-
-        #get highest-level tasklist element
-        tlist = document.find("tasklist")
+        If append is True, f holds a later batch of tasks for a document which
+        was already read into data, and the expanded and selected rows from
+        that document are kept.
+        '''
         self.tasklist = data['task_store']
-        self.__read_tasks(tlist, None)
-
-        exp = document.find('expanded')
-        expanded_paths = []
-        for n in exp.findall('path'):
-            expanded_paths.append(n.text)
-        seldata = document.find('selected')
-        sel = seldata.text
-
-        data['expanded'] = expanded_paths
-        data['selected'] = sel
-
-    def __read_tasks(self, tlist, parent=None):
-        '''Internal function to recursively add tasks from an XML file to the treestore self.tasklist.'''
-        for task in tlist.iterfind('./task'):
-            #make a list from subelements and attributes to add to the treestore
-            tasks = []
-            tasks.append(int(task.get('priority')))
-            tasks.append(int(task.find('pct').text))
-            tasks.append(int(task.find('est').text))
-            tasks.append(int(task.find('spent').text))
-            est_begin_raw = task.find('est-begin').text
-            if est_begin_raw is None:
-                tasks.append("")
-            else:
-                tasks.append(dateparse(est_begin_raw))
-            est_complete_raw = task.find('est-complete').text
-            if est_complete_raw is None:
-                tasks.append("")
-            else:
-                tasks.append(dateparse(est_complete_raw))
-            act_begin_raw = task.find('act-begin').text
-            if act_begin_raw is None:
-                tasks.append("")
-            else:
-                tasks.append(dateparse(act_begin_raw))
-            completed_raw = task.find('completed').text
-            if completed_raw is None:
-                tasks.append("")
-            else:
-                tasks.append(dateparse(completed_raw))
-            due_raw = task.find('due').text
-            if due_raw is None:
-                tasks.append("")
-            else:
-                tasks.append(dateparse(due_raw))
-            assigner_raw = task.find('assigner').text
-            if assigner_raw is None: assigner_raw = ''
-            tasks.append(assigner_raw)
-            assignee_raw = task.find('assignee').text
-            if assignee_raw is None: assignee_raw = ''
-            tasks.append(assignee_raw)
-            status_raw = task.find('status').text
-            if status_raw is None: status_raw = ''
-            tasks.append(status_raw)
-            done = task.get('done') == "True"
-            tasks.append(done)
-            tasks.append(task.find('title').text)
-            notes_raw = task.find('notes').text
-            if notes_raw is None: notes_raw = ''
-            tasks.append(notes_raw)
-            tasks.append(task.find('due').get('useTime') == "True")
-            tasks.append(not done) #inverse done
-            tasks.append(False) #time track flag
-
-            #append to store
-            treeiter = self.tasklist.append(parent, tasks)
-            self.__read_tasks(task.find('tasklist'), treeiter)
+        self.__row_ids = data.setdefault('row_ids', {})
+        self.__notes = data.setdefault('notes', {})
+        self.__last_id = max(self.__row_ids) if self.__row_ids else 0
+        self.__dates = {}
+        data['our_version'] = self.file_version
+        if not append:
+            data['expanded'] = []
+            data['selected'] = None
+
+        opened = [] # every element which has started but not yet ended
+        tasks = [] # [element, treeiter, field count, leaves, done leaves] for every open task
+        for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == 'task':
+                    # A task's own fields come before its tasklist, so our
+                    # parent can be stored as soon as its first child appears.
+                    if tasks and tasks[-1][1] is None:
+                        self.__store_branch(tasks)
+                    tasks.append([elem, None, 0, 0, 0])
+                elif elem.tag == 'htd':
+                    data['save_version'] = float(elem.get('version'))
+                opened.append(elem)
+                continue
+
+            opened.pop()
+            parent = opened[-1] if opened else None
+
+            if elem.tag == 'task':
+                task, treeiter, nfields, leaves, done_leaves = tasks.pop()
+                if treeiter is None:
+                    parent_iter = tasks[-1][1] if tasks else None
+                    row = self.__make_row(task)
+                    self.__row_ids[row[20]] = self.tasklist.append(parent_iter, row)
+                    leaves, done_leaves = row[18], row[19]
+                else:
+                    if len(task) > nfields:
+                        # some fields came after our children, so store them now
+                        self.tasklist[treeiter] = self.__make_row(task, self.tasklist[treeiter][20])
+                    self.tasklist.set(treeiter, [18, 19], [leaves, done_leaves])
+
+                # branches count the leaf tasks beneath them
+                if tasks:
+                    tasks[-1][3] += leaves
+                    tasks[-1][4] += done_leaves
+                elem.clear()
+                parent.remove(elem)
+                continue
+
+            # everything else is a direct child of the root element
+            if parent is None or parent.tag != 'htd':
+                continue
+
+            if elem.tag == 'assigners':
+                for n in elem.findall('name'):
+                    if n.text not in data['from_list']:
+                        data['from_list'].append(n.text)
+            elif elem.tag == 'assignees':
+                for n in elem.findall('name'):
+                    if n.text not in data['to_list']:
+                        data['to_list'].append(n.text)
+            elif elem.tag == 'statii':
+                for n in elem.findall('name'):
+                    if n.text not in data['status_list']:
+                        data['status_list'].append(n.text)
+            elif elem.tag == 'columns':
+                for c in elem.findall('col'):
+                    data['cols'].append((c.text, c.attrib['visible'] == "True"))
+            elif elem.tag == 'geometry':
+                maxed = elem.find('maximized').text == "True"
+                height = int(elem.find('height').text)
+                width = int(elem.find('width').text)
+                task_width = int(elem.find('task-width').text)
+                data['geometry'] = (maxed, height, width, task_width)
+            elif elem.tag == 'expanded':
+                for n in elem.findall('path'):
+                    data['expanded'].append(n.text)
+            elif elem.tag == 'selected':
+                data['selected'] = elem.text
+            parent.remove(elem)
+
+        self.tasklist = None
+        self.__row_ids = None
+        self.__notes = None
+        self.__dates = {}
+
+    def __store_branch(self, tasks):
+        '''Appends the innermost open task of tasks before its children arrive'''
+        node = tasks[-1]
+        parent_iter = tasks[-2][1] if len(tasks) > 1 else None
+        row = self.__make_row(node[0])
+        node[1] = self.__row_ids[row[20]] = self.tasklist.append(parent_iter, row)
+        node[2] = len(node[0])
+
+    def __make_row(self, task, row_id=None):
+        '''Builds a treestore row from the fields of a task element
+
+        A new row id is handed out unless row_id is given.
+        '''
+        if row_id is None:
+            self.__last_id += 1
+            row_id = self.__last_id
+        row = []
+        row.append(int(task.get('priority')))
+        row.append(int(task.findtext('pct')))
+        row.append(int(task.findtext('est')))
+        row.append(int(task.findtext('spent')))
+        row.append(self.__read_date(task.findtext('est-begin')))
+        row.append(self.__read_date(task.findtext('est-complete')))
+        row.append(self.__read_date(task.findtext('act-begin')))
+        row.append(self.__read_date(task.findtext('completed')))
+        row.append(self.__read_date(task.findtext('due')))
+        row.append(task.findtext('assigner') or '')
+        row.append(task.findtext('assignee') or '')
+        row.append(task.findtext('status') or '')
+        done = task.get('done') == "True"
+        row.append(done)
+        row.append(task.findtext('title'))
+        notes = task.findtext('notes') or ''
+        if notes:
+            if isinstance(notes, unicode):
+                notes = notes.encode('utf-8')
+            self.__notes[row_id] = notes
+        row.append(tools.note_preview(notes))
+        due = task.find('due')
+        row.append(due is not None and due.get('useTime') == "True")
+        row.append(not done) #inverse done
+        row.append(False) #time track flag
+        row.append(1) #leaf tasks, corrected later for branches
+        row.append(int(done)) #done leaf tasks
+        row.append(row_id)
+        row.append(True) #shown while filtered
+        return row
+
+    def __read_date(self, raw):
+        '''Converts a stored date string into a datetime, or "" if empty
+
+        We only ever write "%Y-%m-%d" or "%Y-%m-%d %H:%M", so those are decoded
+        by hand. Anything else came from an older or hand-edited file and is
+        given to dateutil. Results are memoized since lists tend to share a
+        small number of dates.
+        '''
+        if not raw:
+            return ""
+        try:
+            return self.__dates[raw]
+        except KeyError:
+            pass
+
+        dt = None
+        size = len(raw)
+        if (size == 10 or size == 16) and raw[4] == '-' and raw[7] == '-':
+            try:
+                if size == 10:
+                    dt = datetime(int(raw[0:4]), int(raw[5:7]), int(raw[8:10]))
+                elif raw[10] == ' ' and raw[13] == ':':
+                    dt = datetime(int(raw[0:4]), int(raw[5:7]), int(raw[8:10]), int(raw[11:13]), int(raw[14:16]))
+            except ValueError:
+                dt = None
+        if dt is None:
+            dt = dateparse(raw)
+
+        self.__dates[raw] = dt
+        return dt
 
     def write(self, data, append):
         if append is True and isfile(data['filename']):
@@ -163,6 +238,76 @@ class FileFilter(Gtk.FileFilter):
 
     def write_simple(self, data, filename=None):
         '''Writes todo list data to xml file. Data is a dictionary of data pieces to store.'''
+        htd = self.make_document(data)
+
+        # write to output file
+        if filename is None:
+            # get name from data if none is provided
+            filename = data['filename']
+        with atomic.replace(filename, data.get('backups') or 0) as f:
+            f.write(ElementTree.tostring(htd, encoding="UTF-8"))
+
+    def snapshot(self, data):
+        '''Copies everything a save needs out of the gui and into data
+
+        Fills data['tasks'] with snapshot_tasks() and data['expanded'] with the
+        paths of the expanded rows in data['task_view']. This has to run on the
+        main loop, but once it has, write() only reads data and is safe to
+        call from another thread.
+
+        If data has a 'task_roots' list of iters, only those rows and their
+        children are copied. Full notes are taken from data['notes'] when it is
+        present.
+        '''
+        model = data['task_store']
+        roots = data.get('task_roots')
+        notes = data.get('notes')
+        if roots is None:
+            data['tasks'] = self.snapshot_tasks(model, None, notes)
+        else:
+            data['tasks'] = [self.snapshot_row(model, treeiter, notes) for treeiter in roots]
+        data['expanded'] = []
+        view_model = data['task_view'].get_model()
+        def add_expanded(view, path, expanded):
+            #a filtered view has its own paths
+            if view_model is not None and view_model is not model:
+                path = view_model.convert_path_to_child_path(path)
+            expanded.append(path.to_string())
+        data['task_view'].map_expanded_rows(add_expanded, data['expanded'])
+
+    def snapshot_tasks(self, model, treeiter=None, notes=None):
+        '''Returns the rows below treeiter as a list of (values, children) tuples
+
+        Values holds the saved columns of a row in column order, and children
+        is a list of the same kind for the row's own children.
+
+        Column 14 of model only holds note previews. If notes, a dict of full
+        notes keyed by row id, is given, the full notes are saved instead.
+        '''
+        nodes = []
+        treeiter = model.iter_children(treeiter)
+        while treeiter is not None:
+            nodes.append(self.snapshot_row(model, treeiter, notes))
+            treeiter = model.iter_next(treeiter)
+        return nodes
+
+    def snapshot_row(self, model, treeiter, notes=None):
+        '''Returns the (values, children) tuple for a single row'''
+        values = model.get(treeiter, *self.saved_cols)
+        if notes is not None:
+            values = values[:14] + (notes.get(model.get_value(treeiter, 20), ''),) + values[15:]
+        children = self.snapshot_tasks(model, treeiter, notes) if model.iter_has_child(treeiter) else []
+        return (values, children)
+
+    def make_document(self, data):
+        '''Builds the xml tree for todo list data and returns its root element
+
+        Tasks and expanded rows come from snapshot(), which is called here if
+        the caller has not done so already.
+        '''
+        if 'tasks' not in data:
+            self.snapshot(data)
+
         htd = Element('htd')
         htd.set('version', self.file_version)
 
@@ -184,7 +329,9 @@ class FileFilter(Gtk.FileFilter):
 
         #store list of expanded rows
         exp = SubElement(htd, 'expanded')
-        data['task_view'].map_expanded_rows(self.map_expanded, exp)
+        for path in data['expanded']:
+            row = SubElement(exp, 'path')
+            row.text = path
 
         #store path of selected row
         sel = SubElement(htd, 'selected')
@@ -212,14 +359,9 @@ class FileFilter(Gtk.FileFilter):
         tasklist = SubElement(htd, 'tasklist')
 
         #iterate tasks and add to tasklist element
-        self.store_tasks(data['task_store'], tasklist)
+        self.store_snapshot(data['tasks'], tasklist)
 
-        # write to output file
-        if filename is None:
-            # get name from data if none is provided
-            filename = data['filename']
-        with open(filename, 'wb') as f:
-            f.write(ElementTree.tostring(htd, encoding="UTF-8"))
+        return htd
 
     def write_append(self, data, ):
         '''Appends tasks to an existing file. CAUTION: This function does not add or update anything besides tasks.'''
@@ -229,10 +371,12 @@ class FileFilter(Gtk.FileFilter):
         htd = document.getroot()
         tasklist = document.find("tasklist")
         # TODO update the rest of the saved info
-        self.store_tasks(data['task_store'], tasklist)
+        if 'tasks' not in data:
+            self.snapshot(data)
+        self.store_snapshot(data['tasks'], tasklist)
 
         #write to file
-        with open(filename, 'wb') as datafile:
+        with atomic.replace(data['filename'], data.get('backups') or 0) as datafile:
             datafile.write(ElementTree.tostring(htd, encoding="UTF-8"))
 
     def map_expanded(self, treeview, path, xml):
@@ -240,42 +384,43 @@ class FileFilter(Gtk.FileFilter):
         row.text = str(path)
 
     def store_tasks(self, treestore, taskelem):
-        self.tasklist = treestore
-        treeiter = self.tasklist.get_iter_first()
-        self.__store_peers(treeiter, taskelem)
-        self.tasklist = None
+        self.store_snapshot(self.snapshot_tasks(treestore), taskelem)
 
-    def __store_peers(self, treeiter, taskelem):
-        while treeiter is not None:
+    def store_snapshot(self, nodes, taskelem):
+        '''Adds a task element to taskelem for every node from snapshot_tasks()'''
+        self.__store_peers(nodes, taskelem)
+
+    def __store_peers(self, nodes, taskelem):
+        for row, children in nodes:
             task = SubElement(taskelem, 'task')
-            task.set('done', str(self.tasklist[treeiter][12]))
-            task.set('priority', str(self.tasklist[treeiter][0]))
+            task.set('done', str(row[12]))
+            task.set('priority', str(row[0]))
             e = SubElement(task, 'pct') #pct complete
-            e.text = str(self.tasklist[treeiter][1])
+            e.text = str(row[1])
             e = SubElement(task, 'est') #est time
-            e.text = str(self.tasklist[treeiter][2])
+            e.text = str(row[2])
             e = SubElement(task, 'spent') #time spent
-            e.text = str(self.tasklist[treeiter][3])
+            e.text = str(row[3])
 
             #duetime flag changes datetime format
-            duetime = self.tasklist[treeiter][15]
+            duetime = row[15]
             fmt = "%Y-%m-%d %H:%M" if duetime else "%Y-%m-%d" #uses ISO 8601 format
 
             #due
-            if self.tasklist[treeiter][8] is not '':
-                val = self.tasklist[treeiter][8]
+            if row[8] is not '':
+                val = row[8]
                 out = "" if val is '' else val.strftime(fmt)
 
                 due = SubElement(task, 'due')
                 due.text = out
-                due.set('useTime', str(self.tasklist[treeiter][15]))
+                due.set('useTime', str(row[15]))
             else:
                 due = SubElement(task, 'due')
-                due.set('useTime', str(self.tasklist[treeiter][15]))
+                due.set('useTime', str(row[15]))
 
             #completed
-            if self.tasklist[treeiter][7] is not '':
-                val = self.tasklist[treeiter][7]
+            if row[7] is not '':
+                val = row[7]
                 out = "" if val is '' else val.strftime(fmt)
 
                 e = SubElement(task, 'completed')
@@ -284,8 +429,8 @@ class FileFilter(Gtk.FileFilter):
                 SubElement(task, 'completed')
 
             #est begin
-            if self.tasklist[treeiter][4] is not '':
-                val = self.tasklist[treeiter][4]
+            if row[4] is not '':
+                val = row[4]
                 out = "" if val is '' else val.strftime(fmt)
 
                 e = SubElement(task, 'est-begin')
@@ -294,8 +439,8 @@ class FileFilter(Gtk.FileFilter):
                 SubElement(task, 'est-begin')
 
             #est complete
-            if self.tasklist[treeiter][5] is not '':
-                val = self.tasklist[treeiter][5]
+            if row[5] is not '':
+                val = row[5]
                 out = "" if val is '' else val.strftime(fmt)
 
                 e = SubElement(task, 'est-complete')
@@ -304,8 +449,8 @@ class FileFilter(Gtk.FileFilter):
                 SubElement(task, 'est-complete')
 
             #act begin
-            if self.tasklist[treeiter][6] is not "":
-                val = self.tasklist[treeiter][6]
+            if row[6] is not "":
+                val = row[6]
                 out = "" if val is '' else val.strftime(fmt)
 
                 e = SubElement(task, 'act-begin')
@@ -313,17 +458,15 @@ class FileFilter(Gtk.FileFilter):
             else:
                 SubElement(task, 'act-begin')
             e = SubElement(task, 'assigner')
-            e.text = unicode(self.tasklist[treeiter][9], 'utf-8')
+            e.text = unicode(row[9], 'utf-8')
             e = SubElement(task, 'assignee')
-            e.text = unicode(self.tasklist[treeiter][10], 'utf-8')
+            e.text = unicode(row[10], 'utf-8')
             e = SubElement(task, 'status')
-            e.text = unicode(self.tasklist[treeiter][11], 'utf-8')
+            e.text = unicode(row[11], 'utf-8')
             e = SubElement(task, 'title')
-            e.text = unicode(self.tasklist[treeiter][13], 'utf-8')
+            e.text = unicode(row[13], 'utf-8')
             e = SubElement(task, 'notes')
-            e.text = unicode(self.tasklist[treeiter][14], 'utf-8')
+            e.text = unicode(row[14], 'utf-8')
             tlist = SubElement(task, 'tasklist')
-            if self.tasklist.iter_has_child(treeiter):
-                childiter = self.tasklist.iter_children(treeiter)
-                self.__store_peers(childiter, tlist)
-            treeiter = self.tasklist.iter_next(treeiter)
\ No newline at end of file
+            if children:
+                self.__store_peers(children, tlist)
\ No newline at end of file
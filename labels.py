@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# Copyright 2013 Peter Andrews
+
+# This file is part of HiToDo.
+#
+# HiToDo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HiToDo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gtk
+
+ID_COL = 20 #task store column holding each row's unique id
+
+class LabelRegistry(object):
+    '''One list's set of labels for a task column (assigner, assignee or status)
+
+    The labels are kept in a set for membership tests and in a sorted
+    Gtk.ListStore, self.store, for the editing widgets. Iterating a registry
+    yields its labels in no particular order.
+
+    The registry can also say which rows carry a label. That index is built
+    from the task store on first use and then kept current through the
+    store's signals, so until something asks, it costs nothing.
+    '''
+
+    def __init__(self, tasklist, column):
+        '''Arguments:
+        tasklist - Gtk.TreeStore - The task store whose rows carry the labels
+        column - int - The task store column the labels appear in
+        '''
+        self.tasklist = tasklist
+        self.column = column
+        self.store = Gtk.ListStore(str)
+        self.store.set_sort_column_id(0, Gtk.SortType.ASCENDING)
+        self.labels = set()
+        self.rows_by_label = None #label -> set of row ids, None until first used
+        self.label_by_row = None #row id -> label
+        self.handlers = []
+
+    def __contains__(self, label):
+        return label in self.labels
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def sorted(self):
+        '''Returns our labels as a sorted list'''
+
+        return sorted(self.labels)
+
+    def add(self, label):
+        '''Adds label unless it is blank or already known
+
+        Returns whether label was added.
+        '''
+        if label == '' or label is None or label in self.labels:
+            return False
+        self.labels.add(label)
+        self.store.append([label])
+        return True
+
+    def discard(self, label):
+        '''Removes label from the list of labels, if present
+
+        Rows carrying label keep it.
+        '''
+        if label not in self.labels: return
+        self.labels.discard(label)
+        treeiter = self.store.get_iter_first()
+        while treeiter is not None:
+            if self.store[treeiter][0] == label:
+                self.store.remove(treeiter)
+                break
+            treeiter = self.store.iter_next(treeiter)
+
+    def set_labels(self, labels):
+        '''Replaces every label with those in labels'''
+
+        self.labels = set(label for label in labels if label)
+        self.store.clear()
+        for label in self.labels:
+            self.store.append([label])
+
+    def rows(self, label):
+        '''Returns the set of ids of the rows carrying label
+
+        The set belongs to the registry and must not be changed.
+        '''
+        self.__build_index()
+        return self.rows_by_label.get(label, frozenset())
+
+    def counts(self):
+        '''Returns a dict of how many rows carry each label in use'''
+
+        self.__build_index()
+        return dict((label, len(ids)) for label, ids in self.rows_by_label.items())
+
+    def forget(self, row_id):
+        '''Drops a row which is about to be removed from the index'''
+
+        if self.label_by_row is None: return
+        label = self.label_by_row.pop(row_id, None)
+        if label is not None:
+            self.__unlink(label, row_id)
+
+    def drop_index(self):
+        '''Throws the row index away, e.g. before the task store is cleared
+
+        It is rebuilt the next time it is needed.
+        '''
+        for handler in self.handlers:
+            self.tasklist.disconnect(handler)
+        self.handlers = []
+        self.rows_by_label = None
+        self.label_by_row = None
+
+    def __build_index(self):
+        if self.rows_by_label is not None: return
+
+        self.rows_by_label = {}
+        self.label_by_row = {}
+        self.tasklist.foreach(self.__index_row, None)
+        self.handlers = [
+            self.tasklist.connect("row-changed", self.__index_row),
+            self.tasklist.connect("row-inserted", self.__index_row)
+        ]
+
+    def __index_row(self, model, path, treeiter, data=None):
+        label, row_id = model.get(treeiter, self.column, ID_COL)
+        old_label = self.label_by_row.get(row_id)
+        if label == old_label: return False
+
+        if old_label is not None:
+            self.__unlink(old_label, row_id)
+        self.label_by_row[row_id] = label
+        self.rows_by_label.setdefault(label, set()).add(row_id)
+        return False #keeps foreach() going
+
+    def __unlink(self, label, row_id):
+        ids = self.rows_by_label[label]
+        ids.discard(row_id)
+        if not ids:
+            del self.rows_by_label[label]
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+# Copyright 2013 Peter Andrews
+
+# This file is part of HiToDo.
+#
+# HiToDo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HiToDo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left, insort
+from array import array
+import sys
+import re
+
+TITLE_COL = 13 #task store column holding each row's title
+ID_COL = 20 #task store column holding each row's unique id
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+PREFIX_WORDS = 64 #a query's last word only matches as a whole word if more than this many start with it
+INDEX_MAGIC = "htd-index"
+INDEX_VERSION = "1"
+
+def split_words(text):
+    '''Returns the lower case words in text, a utf-8 str or unicode, in order'''
+
+    if not text: return []
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    return WORD_RE.findall(text.lower())
+
+def words(text):
+    '''Returns the set of lower case words in text'''
+
+    return frozenset(split_words(text))
+
+def dump_index(row_words, digest):
+    '''Returns a saved copy of a document's index, for load_index()
+
+    row_words holds the set of words of every row in document order, as made
+    by words(). digest is the sha1 hex digest of the document, which
+    load_index() checks before trusting the copy.
+
+    The copy starts with utf-8 text: a header line, a line of counts, a line
+    for every word, in sorted order, with the number of rows holding it,
+    a line for every row listing the numbers of its words in that order, and
+    an end marker. After that come the numbers of the rows holding each word,
+    counting from 1, as 32 bit little endian integers. Those make up the
+    index proper and load without any parsing, while a row's own line is
+    only needed once the row changes.
+    '''
+    vocabulary = sorted(set().union(*row_words)) if row_words else []
+    numbers = dict((word, n) for n, word in enumerate(vocabulary))
+    postings = [array('I') for word in vocabulary]
+    rows = []
+    for ordinal, row in enumerate(row_words, 1):
+        nums = [numbers[word] for word in row]
+        for n in nums:
+            postings[n].append(ordinal)
+        rows.append(' '.join(map(str, nums)))
+
+    lines = ["%s %s %s" % (INDEX_MAGIC, INDEX_VERSION, digest), "%d %d" % (len(vocabulary), len(rows))]
+    lines.extend("%s %d" % (word.encode('utf-8'), len(ids)) for word, ids in zip(vocabulary, postings))
+    lines.extend(rows)
+    lines.append("end")
+
+    ids = array('I')
+    for word_ids in postings:
+        ids.extend(word_ids)
+    if sys.byteorder != 'little':
+        ids.byteswap()
+    return '\n'.join(lines) + '\n' + ids.tostring()
+
+def load_index(f, digest, first_id):
+    '''Reads an index saved by dump_index() from the file object f
+
+    The document's rows are numbered from first_id, the id its first row
+    was given when read. Returns a (rows_by_word, saved_rows) pair for
+    SearchIndex.set_loader(), or None if f is damaged or was saved for a
+    document other than the one with the sha1 hex digest.
+
+    saved_rows is a (vocabulary, lines, first_id) tuple. The lines of the
+    rows are kept as they were read, and SearchIndex only decodes the words
+    of a row when it first needs them.
+    '''
+    raw = f.read()
+    split = raw.find('\nend\n') # no word or row line can be just "end"
+    if split < 0: return None
+    lines = raw[:split].split('\n')
+    if lines[0].split() != [INDEX_MAGIC, INDEX_VERSION, digest]:
+        return None
+
+    try:
+        nwords, nrows = map(int, lines[1].split())
+        if len(lines) != 2 + nwords + nrows:
+            return None
+        ids = array('I')
+        ids.fromstring(raw[split + 5:])
+    except (ValueError, IndexError):
+        return None
+    if sys.byteorder != 'little':
+        ids.byteswap()
+    shift = first_id - 1
+
+    vocabulary = []
+    rows_by_word = {}
+    start = 0
+    try:
+        for line in lines[2:2 + nwords]:
+            word, count = line.split(' ')
+            word = word.decode('utf-8')
+            end = start + int(count)
+            vocabulary.append(word)
+            if shift:
+                rows_by_word[word] = set(row_id + shift for row_id in ids[start:end])
+            else:
+                rows_by_word[word] = set(ids[start:end])
+            start = end
+    except (ValueError, UnicodeDecodeError):
+        return None
+    #the postings have to add up to exactly what was written
+    if start != len(ids):
+        return None
+
+    return (rows_by_word, (vocabulary, lines[2 + nwords:], first_id))
+
+class SearchIndex(object):
+    '''An inverted index from words to the rows whose title or notes hold them
+
+    Full notes are read from notes, the dict of row id -> note text which
+    HiToDo keeps alongside the task store, since the store only holds a
+    preview of each note.
+
+    Like labels.LabelRegistry, the index is built from the task store on
+    first use and then kept current through the store's row-changed and
+    row-inserted signals. Rows which are about to be removed must be passed
+    to forget(), since row-deleted only gives the path of a row already gone.
+
+    A file can come with a saved copy of its index, see set_loader(). It is
+    then loaded on first use instead of being built.
+    '''
+
+    def __init__(self, tasklist, notes):
+        '''Arguments:
+        tasklist - Gtk.TreeStore - The task store to index
+        notes - dict - Row id -> full note text for every row with a note
+        '''
+        self.tasklist = tasklist
+        self.notes = notes
+        self.rows_by_word = None #word -> set of row ids, None until first used
+        self.words_by_row = None #row id -> frozenset of words
+        self.saved_rows = None #rows of a loaded index not yet in words_by_row, see load_index()
+        self.text_by_row = None #row id -> (title, note) the words came from
+        self.vocabulary = None #every indexed word, sorted for prefix lookups
+        self.handlers = []
+        self.loader = None #see set_loader()
+        self.stale = {} #row id -> treeiter of rows changed before loading
+        self.forgotten = set() #ids of rows removed before loading
+
+    def search(self, query):
+        '''Returns the set of ids of the rows which contain every word in query
+
+        The last word also matches longer words it starts, so results follow
+        along while a query is typed, unless so many words start with it that
+        merging their rows would be slow. The set belongs to the caller.
+        '''
+        self.__build_index()
+        query = split_words(query)
+        if not query: return set()
+        prefix = query.pop()
+
+        exact = []
+        for word in set(query):
+            ids = self.rows_by_word.get(word)
+            if ids is None: return set()
+            exact.append(ids)
+
+        starts = self.__words_starting(prefix)
+        if len(starts) > PREFIX_WORDS:
+            starts = [prefix] if prefix in self.rows_by_word else []
+        if not starts: return set()
+
+        if not exact:
+            if len(starts) == 1:
+                return set(self.rows_by_word[starts[0]])
+            return set().union(*[self.rows_by_word[word] for word in starts])
+
+        exact.sort(key=len)
+        found = set(exact[0]).intersection(*exact[1:])
+        if len(starts) == 1:
+            found &= self.rows_by_word[starts[0]]
+        else:
+            starts = frozenset(starts)
+            found = set(row_id for row_id in found if not self.__row_words(row_id).isdisjoint(starts))
+        return found
+
+    def set_loader(self, loader):
+        '''Has the index loaded by calling loader when it is first used
+
+        loader returns an index from load_index() for the rows as they were
+        when the loader was set, or None to build the index as usual.
+        Until then, rows which change are only noted, and they are indexed
+        again once the rest has been loaded.
+        '''
+        self.drop_index()
+        if loader is None: return
+
+        self.loader = loader
+        self.handlers = [
+            self.tasklist.connect("row-changed", self.__mark_stale),
+            self.tasklist.connect("row-inserted", self.__mark_stale)
+        ]
+
+    def block(self):
+        '''Stops watching the task store, for changes which leave all text alone'''
+
+        for handler in self.handlers:
+            self.tasklist.handler_block(handler)
+
+    def unblock(self):
+        '''Watches the task store again after block()'''
+
+        for handler in self.handlers:
+            self.tasklist.handler_unblock(handler)
+
+    def forget(self, row_id):
+        '''Drops a row which is about to be removed from the index'''
+
+        if self.loader is not None:
+            self.stale.pop(row_id, None)
+            self.forgotten.add(row_id)
+            return
+        if self.words_by_row is None: return
+        self.text_by_row.pop(row_id, None)
+        for word in self.__row_words(row_id):
+            self.__unlink(word, row_id)
+        self.words_by_row.pop(row_id, None)
+
+    def drop_index(self):
+        '''Throws the index away, e.g. before the task store is cleared
+
+        It is rebuilt the next time it is needed.
+        '''
+        for handler in self.handlers:
+            self.tasklist.disconnect(handler)
+        self.handlers = []
+        self.rows_by_word = None
+        self.words_by_row = None
+        self.saved_rows = None
+        self.text_by_row = None
+        self.vocabulary = None
+        self.loader = None
+        self.stale = {}
+        self.forgotten = set()
+
+    def __build_index(self):
+        if self.rows_by_word is not None: return
+
+        loaded = self.loader() if self.loader is not None else None
+        stale = self.stale
+        forgotten = self.forgotten
+        self.drop_index()
+
+        self.text_by_row = {}
+        self.words_by_row = {}
+        if loaded is None:
+            self.rows_by_word = {}
+            self.tasklist.foreach(self.__index_row, None)
+        else:
+            #a loaded row's text is unknown, so its first change always splits it again
+            self.rows_by_word, self.saved_rows = loaded
+            for row_id in forgotten:
+                self.forget(row_id)
+        self.vocabulary = sorted(self.rows_by_word)
+
+        if loaded is not None:
+            for treeiter in stale.itervalues():
+                self.__index_row(self.tasklist, None, treeiter)
+        self.handlers = [
+            self.tasklist.connect("row-changed", self.__index_row),
+            self.tasklist.connect("row-inserted", self.__index_row)
+        ]
+
+    def __index_row(self, model, path, treeiter, data=None):
+        title, row_id = model.get(treeiter, TITLE_COL, ID_COL)
+        text = (title, self.notes.get(row_id, ''))
+        #most changes, like filter visibility or dates, leave the text alone
+        if self.text_by_row.get(row_id) == text: return False
+        self.text_by_row[row_id] = text
+
+        new_words = words(text[0]) | words(text[1])
+        old_words = self.__row_words(row_id)
+        self.words_by_row[row_id] = new_words
+        for word in old_words - new_words:
+            self.__unlink(word, row_id)
+        for word in new_words - old_words:
+            ids = self.rows_by_word.get(word)
+            if ids is None:
+                ids = self.rows_by_word[word] = set()
+                if self.vocabulary is not None:
+                    insort(self.vocabulary, word)
+            ids.add(row_id)
+        return False #keeps foreach() going
+
+    def __row_words(self, row_id):
+        '''Returns the words indexed for a row, decoding them from a loaded index if need be'''
+
+        found = self.words_by_row.get(row_id)
+        if found is not None: return found
+
+        found = frozenset()
+        if self.saved_rows is not None:
+            vocabulary, lines, first_id = self.saved_rows
+            n = row_id - first_id
+            if 0 <= n < len(lines) and lines[n] is not None:
+                found = frozenset(vocabulary[int(i)] for i in lines[n].split())
+                lines[n] = None #words_by_row has it from now on
+                self.words_by_row[row_id] = found
+        return found
+
+    def __mark_stale(self, model, path, treeiter):
+        self.stale[model.get_value(treeiter, ID_COL)] = treeiter
+
+    def __unlink(self, word, row_id):
+        ids = self.rows_by_word[word]
+        ids.discard(row_id)
+        if not ids:
+            del self.rows_by_word[word]
+            if self.vocabulary is not None:
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+
+    def __words_starting(self, prefix):
+        '''Returns the indexed words which start with prefix
+
+        Stops after PREFIX_WORDS + 1 of them, which is enough to know there
+        are too many.
+        '''
+
+        found = []
+        n = bisect_left(self.vocabulary, prefix)
+        end = min(n + PREFIX_WORDS + 1, len(self.vocabulary))
+        while n < end and self.vocabulary[n].startswith(prefix):
+            found.append(self.vocabulary[n])
+            n += 1
+        return found
@@ -41,6 +41,10 @@ class settings(object):
     "default-status": [],
     "default-from": [],
     "default-to": [],
+    "save-compression": "fast",
+    "backup-count": 0,
+    "undo-max-entries": 1000,
+    "undo-max-bytes": 67108864,
     "default-columns": ["priority", "pct complete", "time est", "time spent", "tracked", "due date", "complete date", "from", "to", "status", "done", "title"]
 }
 '''
@@ -48,7 +52,8 @@ class settings(object):
     def __init__(self, parent):
         '''Load settings
 
-        Loads settings from our config file, if present. Otherwise uses the
+        Loads settings from our config file, if present. Settings missing from
+        the file, such as those added since it was saved, are taken from the
         static self.defaults string.
         '''
         # set config file location
@@ -62,7 +67,9 @@ class settings(object):
         if os.path.isfile(conf):
             try:
                 with open(conf) as f:
-                    self._settings = json.load(f)
+                    loaded = json.load(f)
+                self._settings = json.loads(self.defaults)
+                self._settings.update(loaded)
             except EnvironmentError:
                 pass
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# Copyright 2013 Peter Andrews
+
+# This file is part of HiToDo.
+#
+# HiToDo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HiToDo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
+
+VISIBLE_COL = 21 #task store column holding each row's filtered visibility
+
+class TaskFilter(object):
+    '''Decides which tasks are shown while the task list is filtered
+
+    A task is visible if it matches every criterion or if any of its
+    descendants is visible, so matches always appear with their parents.
+    Visibility is stored in column VISIBLE_COL of the task store, which a
+    Gtk.TreeModelFilter reads directly with set_visible_column().
+
+    Criteria left as None match every task.
+    '''
+
+    def __init__(self, assignees=None, statii=None, priority=None, due=None, done=None):
+        '''Arguments:
+        assignees - set of str - Assignee (To) labels to show
+        statii - set of str - Status labels to show
+        priority - (int, int) - Lowest and highest priority to show
+        due - (datetime, datetime) - Show tasks due within this window. Either
+                                     end may be None to leave it open.
+        done - bool - Show only done (True) or only open (False) tasks
+        '''
+        self.assignees = assignees
+        self.statii = statii
+        self.priority = priority
+        self.due = due
+        self.done = done
+
+    def is_active(self):
+        '''Returns whether any task could be hidden by this filter'''
+
+        return (self.assignees, self.statii, self.priority, self.due, self.done) != (None,) * 5
+
+    def matches(self, model, treeiter):
+        '''Returns whether the row at treeiter meets every criterion'''
+
+        priority, due, assignee, status, done = model.get(treeiter, 0, 8, 10, 11, 12)
+
+        if self.done is not None and done != self.done:
+            return False
+        if self.assignees is not None and assignee not in self.assignees:
+            return False
+        if self.statii is not None and status not in self.statii:
+            return False
+        if self.priority is not None:
+            if priority < self.priority[0] or priority > self.priority[1]:
+                return False
+        if self.due is not None:
+            if due == "":
+                return False
+            if self.due[0] is not None and due < self.due[0]:
+                return False
+            if self.due[1] is not None and due > self.due[1]:
+                return False
+        return True
+
+    def apply(self, model, treeiter=None):
+        '''Sets the visibility of every row below treeiter
+
+        Only rows whose visibility actually changes are written. Returns
+        whether any of the rows is visible.
+        '''
+        any_visible = False
+        child_iter = model.iter_children(treeiter)
+        while child_iter is not None:
+            visible = self.apply(model, child_iter)
+            visible = self.matches(model, child_iter) or visible
+            if model.get_value(child_iter, VISIBLE_COL) != visible:
+                model.set_value(child_iter, VISIBLE_COL, visible)
+            any_visible = any_visible or visible
+            child_iter = model.iter_next(child_iter)
+        return any_visible
+
+    def update(self, model, treeiter):
+        '''Re-evaluates the row at treeiter after it has changed
+
+        The row's ancestors are only visited as long as visibility keeps
+        changing, so most edits cost a single match.
+        '''
+        while treeiter is not None:
+            visible = self.matches(model, treeiter) or self.__child_visible(model, treeiter)
+            if model.get_value(treeiter, VISIBLE_COL) == visible:
+                return
+            model.set_value(treeiter, VISIBLE_COL, visible)
+            treeiter = model.iter_parent(treeiter)
+
+    def __child_visible(self, model, treeiter):
+        child_iter = model.iter_children(treeiter)
+        while child_iter is not None:
+            if model.get_value(child_iter, VISIBLE_COL):
+                return True
+            child_iter = model.iter_next(child_iter)
+        return False
+
+def show_ancestors(model, treeiter):
+    '''Makes every ancestor of treeiter visible, e.g. after inserting it'''
+
+    treeiter = model.iter_parent(treeiter)
+    while treeiter is not None and not model.get_value(treeiter, VISIBLE_COL):
+        model.set_value(treeiter, VISIBLE_COL, True)
+        treeiter = model.iter_parent(treeiter)
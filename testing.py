@@ -24,3 +24,98 @@ def print_rows(store, treeiter, indent):
             childiter = store.iter_children(treeiter)
             print_rows(store, childiter, indent + "\t")
         treeiter = store.iter_next(treeiter)
+
+def check_leaf_counts(store):
+    '''Prints every row whose cached leaf counters (columns 18 and 19) are wrong'''
+    rootiter = store.get_iter_first()
+    check_leaf_rows(store, rootiter)
+
+def check_leaf_rows(store, treeiter):
+    n_leaves = 0
+    n_done = 0
+    while treeiter != None:
+        if store.iter_has_child(treeiter):
+            childiter = store.iter_children(treeiter)
+            counts = check_leaf_rows(store, childiter)
+        else:
+            counts = (1, int(store[treeiter][12]))
+        cached = (store[treeiter][18], store[treeiter][19])
+        if cached != counts:
+            print str(store.get_path(treeiter)) + ": cached " + str(cached) + ", counted " + str(counts)
+        n_leaves += counts[0]
+        n_done += counts[1]
+        treeiter = store.iter_next(treeiter)
+    return n_leaves, n_done
+
+def check_row_ids(store, row_ids):
+    '''Prints every row whose id (column 20) is missing from or wrong in row_ids'''
+    seen = set()
+    store.foreach(check_row_id, (row_ids, seen))
+    for row_id in set(row_ids) - seen:
+        print "stale id " + str(row_id)
+
+def check_row_id(store, path, treeiter, data):
+    row_ids, seen = data
+    row_id = store[treeiter][20]
+    seen.add(row_id)
+    if row_id not in row_ids or store.get_path(row_ids[row_id]) != path:
+        print str(path) + ": id " + str(row_id) + " not indexed"
+    return False
+
+def benchmark_undo(htd, n_ops=10000, seed=0):
+    '''Times undoing and then redoing n_ops random edits to htd's open list
+
+    Meant to be run by hand on a running HiToDo with a large list loaded. The
+    edits are a seeded mix of title, priority, est, done, and delete actions
+    on rows picked all over the tree.
+    '''
+    import random
+    from time import time
+
+    rng = random.Random(seed)
+    store = htd.tasklist
+    htd.focus = htd.task_view
+    del htd.undobuffer[:]
+    del htd.redobuffer[:]
+    #keep every action so all of them are replayed
+    limits = (htd.undobuffer.max_entries, htd.undobuffer.max_bytes)
+    htd.undobuffer.max_entries = htd.redobuffer.max_entries = 0
+    htd.undobuffer.max_bytes = htd.redobuffer.max_bytes = 0
+
+    start = time()
+    for n in xrange(n_ops):
+        if not htd.row_ids: break
+        treeiter = htd.row_ids[rng.choice(htd.row_ids.keys())]
+        path = store.get_path(treeiter).to_string()
+        op = rng.randrange(10)
+        if op < 3:
+            htd.commit_title(path=path, new_title="Task %d" % n)
+        elif op < 6:
+            htd.commit_priority(path=path, new_priority=str(rng.randrange(1, 10)))
+        elif op < 8:
+            htd.commit_work(htd, path, rng.randrange(1, 40), 'est')
+        elif op < 9:
+            htd.commit_done(htd, path)
+        else:
+            htd.selection.unselect_all()
+            htd.selection.select_iter(treeiter)
+            htd.del_current_task()
+    edit_time = time() - start
+    n_done = len(htd.undobuffer)
+
+    start = time()
+    while len(htd.undobuffer):
+        htd.do_undo()
+    undo_time = time() - start
+
+    start = time()
+    while len(htd.redobuffer):
+        htd.do_redo()
+    redo_time = time() - start
+
+    htd.undobuffer.max_entries, htd.undobuffer.max_bytes = limits
+    htd.redobuffer.max_entries, htd.redobuffer.max_bytes = limits
+
+    print "%d actions: edit %.3fs, undo %.3fs, redo %.3fs" % (n_done, edit_time, undo_time, redo_time)
+    check_row_ids(store, htd.row_ids)
+    check_leaf_counts(store)
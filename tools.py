@@ -18,6 +18,7 @@
 # along with HiToDo.  If not, see <http://www.gnu.org/licenses/>.
 
 from gi.repository import Gtk
+from os import linesep
 
 def copy_treemodel(orig):
     '''Create a new treemodel with the same columns as model'''
@@ -29,20 +30,6 @@ def copy_treemodel(orig):
     copy = Gtk.TreeStore(*column_types)
     return copy
 
-def append_row(orig, path, treeiter, copy):
-    '''Append a row to the treemodel copy from the treemodel orig
-
-    Preserves parent-child relationships. Meant to be run as
-    'orig.foreach(append_row, copy)'
-    '''
-    strpath = path.to_string()
-
-    parts = strpath.rsplit(':', 1)
-    parent_path = parts[0]
-    parent_iter = None if parent_path == strpath else copy.get_iter(parent_path)
-
-    copy.append(parent_iter, orig[treeiter][:])
-
 def is_number(s):
     '''Determines whether s can be cast to a float'''
 
@@ -51,3 +38,19 @@ def is_number(s):
         return True
     except ValueError:
         return False
+
+PREVIEW_LENGTH = 100 #bytes of a note shown beside its task's title
+
+def note_preview(note):
+    '''Returns the start of note on a single line
+
+    The preview is what the task list keeps and draws for a note, so it is cut
+    to PREVIEW_LENGTH to keep drawing cost independent of the note's size.
+    '''
+    if len(note) > PREVIEW_LENGTH:
+        note = note[:PREVIEW_LENGTH]
+        if isinstance(note, str):
+            # drop a utf-8 character we may have cut in half
+            note = note.decode('utf-8', 'ignore').encode('utf-8')
+        note += '...'
+    return note.replace(linesep, ' ')
@@ -20,22 +20,48 @@
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
 from gi.repository import Gtk
+from collections import deque
+import sys
 
 class UndoableInsert(object):
-    """something that has been inserted into our textbuffer"""
+    """something that has been inserted into our textbuffer
+
+    merged inserts keep their text in pieces which are only joined when the
+    text is needed, so merging never copies what came before"""
+    __slots__ = ('offset', 'pieces', 'length', 'size', 'mergeable')
+
     def __init__(self, text_iter, text, length):
         self.offset = text_iter.get_offset()
-        self.text = text
-        self.length = length
-        if self.length > 1 or self.text in ("\r", "\n", " "):
+        self.pieces = deque((text,))
+        # length counts bytes, but buffer offsets count characters
+        self.length = char_count(text)
+        self.size = len(text)
+        if self.length > 1 or text in ("\r", "\n", " "):
             self.mergeable = False
         else:
             self.mergeable = True
 
+    @property
+    def text(self):
+        return join_pieces(self.pieces)
+
+    def merge(self, cur):
+        """add the insert cur, which directly follows us"""
+        self.pieces.append(cur.text)
+        self.length += cur.length
+        self.size += cur.size
+
 class UndoableDelete(object):
-    """something that has ben deleted from our textbuffer"""
+    """something that has ben deleted from our textbuffer
+
+    like UndoableInsert, merged deletes keep their text in pieces, and
+    backspace adds its pieces at the front"""
+    __slots__ = ('pieces', 'start', 'end', 'size', 'delete_key_used', 'mergeable')
+
     def __init__(self, text_buffer, start_iter, end_iter):
-        self.text = text_buffer.get_text(start_iter, end_iter, True)
+        text = text_buffer.get_text(start_iter, end_iter, True)
+        self.pieces = deque((text,))
+        self.size = len(text)
         self.start = start_iter.get_offset()
         self.end = end_iter.get_offset()
         # need to find out if backspace or delete key has been used
@@ -45,24 +71,57 @@ class UndoableDelete(object):
             self.delete_key_used = True
         else:
             self.delete_key_used = False
-        if self.end - self.start > 1 or self.text in ("\r", "\n", " "):
+        if self.end - self.start > 1 or text in ("\r", "\n", " "):
             self.mergeable = False
         else:
             self.mergeable = True
 
+    @property
+    def text(self):
+        return join_pieces(self.pieces)
+
+    def merge(self, cur):
+        """add the delete cur, which was made right next to us"""
+        if self.start == cur.start: # delete key used
+            self.pieces.append(cur.text)
+            self.end += (cur.end - cur.start)
+        else: # Backspace used
+            self.pieces.appendleft(cur.text)
+            self.start = cur.start
+        self.size += cur.size
+
+def char_count(text):
+    """number of characters in text, which gtk hands us as utf-8"""
+    if isinstance(text, str):
+        return len(text.decode('utf-8'))
+    return len(text)
+
+def join_pieces(pieces):
+    """join pieces into one string, keeping the result as the only piece"""
+    if len(pieces) > 1:
+        text = ''.join(pieces)
+        pieces.clear()
+        pieces.append(text)
+    return pieces[0]
+
 class UndoableTextBuffer(Gtk.TextBuffer):
     """text buffer with added undo capabilities
 
     designed as a drop-in replacement for gtksourceview,
-    at least as far as undo is concerned"""
+    at least as far as undo is concerned
+
+    once the text held by the undo and redo stacks is over max_size bytes,
+    the oldest undo actions are dropped. a max_size of 0 means no limit."""
     
-    def __init__(self):
+    def __init__(self, max_size=0):
         """
         we'll need empty stacks for undo/redo and some state keeping
         """
         Gtk.TextBuffer.__init__(self)
-        self.undo_stack = []
+        self.undo_stack = deque()
         self.redo_stack = []
+        self.max_size = max_size
+        self.stack_size = 0 # bytes of text held by both stacks
         self.not_undoable_action = False
         self.undo_in_progress = False
         self.connect('insert-text', self.on_insert_text)
@@ -78,8 +137,40 @@ class UndoableTextBuffer(Gtk.TextBuffer):
 
     def clear_undo(self):
         '''Void undo/redo buffers.'''
-        self.undo_stack[:] = []
-        self.redo_stack[:] = []
+        self.undo_stack.clear()
+        self.redo_stack = []
+        self.stack_size = 0
+
+    def set_text(self, text, length=-1):
+        """replace the whole text without recording it
+
+        the old actions no longer line up with the new text, so they are
+        thrown away as well"""
+        self.begin_not_undoable_action()
+        Gtk.TextBuffer.set_text(self, text, length)
+        self.end_not_undoable_action()
+        self.clear_undo()
+
+    def __clear_redo(self):
+        for action in self.redo_stack:
+            self.stack_size -= action.size
+        self.redo_stack = []
+
+    def __push_undo(self, action):
+        """add a new action, dropping the oldest ones if we're over max_size
+
+        the newest action is kept even if it is over max_size on its own"""
+        self.undo_stack.append(action)
+        self.stack_size += action.size
+        if not self.max_size:
+            return
+        while self.stack_size > self.max_size and len(self.undo_stack) > 1:
+            self.stack_size -= self.undo_stack.popleft().size
+
+    def __merge_undo(self, cur):
+        """fold cur into the newest action"""
+        self.undo_stack[-1].merge(cur)
+        self.stack_size += cur.size
 
     def on_insert_text(self, textbuffer, text_iter, text, length):
         def can_be_merged(prev, cur):
@@ -94,33 +185,22 @@ class UndoableTextBuffer(Gtk.TextBuffer):
                 return False
             elif cur.offset != (prev.offset + prev.length):
                 return False
-            elif cur.text in WHITESPACE and not prev.text in WHITESPACE:
+            elif cur.text in WHITESPACE and not prev.pieces[-1] in WHITESPACE:
                 return False
-            elif prev.text in WHITESPACE and not cur.text in WHITESPACE:
+            elif prev.pieces[-1] in WHITESPACE and not cur.text in WHITESPACE:
                 return False
             return True
 
         if not self.undo_in_progress:
-            self.redo_stack = []
+            self.__clear_redo()
         if self.not_undoable_action:
             return
         undo_action = UndoableInsert(text_iter, text, length)
-        try:
-            prev_insert = self.undo_stack.pop()
-        except IndexError:
-            self.undo_stack.append(undo_action)
-            return
-        if not isinstance(prev_insert, UndoableInsert):
-            self.undo_stack.append(prev_insert)
-            self.undo_stack.append(undo_action)
-            return
-        if can_be_merged(prev_insert, undo_action):
-            prev_insert.length += undo_action.length
-            prev_insert.text += undo_action.text
-            self.undo_stack.append(prev_insert)
+        prev_insert = self.undo_stack[-1] if self.undo_stack else None
+        if isinstance(prev_insert, UndoableInsert) and can_be_merged(prev_insert, undo_action):
+            self.__merge_undo(undo_action)
         else:
-            self.undo_stack.append(prev_insert)
-            self.undo_stack.append(undo_action)
+            self.__push_undo(undo_action)
         
     def on_delete_range(self, text_buffer, start_iter, end_iter):
         def can_be_merged(prev, cur):
@@ -139,39 +219,23 @@ class UndoableTextBuffer(Gtk.TextBuffer):
             elif prev.start != cur.start and prev.start != cur.end:
                 return False
             elif cur.text not in WHITESPACE and \
-               prev.text in WHITESPACE:
+               prev.pieces[-1] in WHITESPACE:
                 return False
             elif cur.text in WHITESPACE and \
-               prev.text not in WHITESPACE:
+               prev.pieces[-1] not in WHITESPACE:
                 return False
             return True
 
         if not self.undo_in_progress:
-            self.redo_stack = []
+            self.__clear_redo()
         if self.not_undoable_action:
             return
         undo_action = UndoableDelete(text_buffer, start_iter, end_iter)
-        try:
-            prev_delete = self.undo_stack.pop()
-        except IndexError:
-            self.undo_stack.append(undo_action)
-            return
-        if not isinstance(prev_delete, UndoableDelete):
-            self.undo_stack.append(prev_delete)
-            self.undo_stack.append(undo_action)
-            return
-        if can_be_merged(prev_delete, undo_action):
-            if prev_delete.start == undo_action.start: # delete key used
-                prev_delete.text += undo_action.text
-                prev_delete.end += (undo_action.end - undo_action.start)
-            else: # Backspace used
-                prev_delete.text = "%s%s" % (undo_action.text,
-                                                     prev_delete.text)
-                prev_delete.start = undo_action.start
-            self.undo_stack.append(prev_delete)
+        prev_delete = self.undo_stack[-1] if self.undo_stack else None
+        if isinstance(prev_delete, UndoableDelete) and can_be_merged(prev_delete, undo_action):
+            self.__merge_undo(undo_action)
         else:
-            self.undo_stack.append(prev_delete)
-            self.undo_stack.append(undo_action)
+            self.__push_undo(undo_action)
 
     def begin_not_undoable_action(self):
         """don't record the next actions
@@ -237,3 +301,123 @@ class UndoableTextBuffer(Gtk.TextBuffer):
             self.place_cursor(start)
         self.end_not_undoable_action()
         self.undo_in_progress = False
+
+class UndoHistory(object):
+    """bounded stack of task list undo actions
+
+    stands in for the plain list HiToDo used to keep its actions in, so it
+    supports append, pop, peek, len and del history[:]. once it holds more than
+    max_entries actions, or its actions take up more than max_bytes, the
+    oldest ones are dropped. a limit of 0 means no limit.
+
+    long strings (mostly notes) are shared through the blobs dict, which can be
+    handed to several histories so undo and redo keep one copy between them."""
+
+    BLOB_SIZE = 256 # strings at least this long are shared between entries
+
+    def __init__(self, max_entries=0, max_bytes=0, blobs=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.blobs = blobs if blobs is not None else {} # string -> [string, users]
+        self.entries = deque() # (action, size, shared strings)
+        self.blob_users = {} # shared string -> how many of our entries use it
+        self.used = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __delitem__(self, key):
+        """only clearing the whole history with del history[:] is supported"""
+        if key != slice(None):
+            raise TypeError("UndoHistory can only be cleared as a whole")
+        while self.entries:
+            self.__drop(self.entries.pop())
+
+    def __delslice__(self, start, stop):
+        self.__delitem__(slice(None) if (start, stop) == (0, sys.maxint) else slice(start, stop))
+
+    def append(self, action):
+        """add an action, dropping the oldest ones if we are over our limits"""
+        blobs = []
+        action, size = self.__share(action, blobs, set())
+        for blob in blobs:
+            users = self.blob_users.get(blob, 0)
+            if users == 0:
+                self.used += sys.getsizeof(blob)
+            self.blob_users[blob] = users + 1
+        self.entries.append((action, size, blobs))
+        self.used += size
+
+        # the newest action is kept even if it is over budget on its own
+        while len(self.entries) > 1 and self.__over_limits():
+            self.__drop(self.entries.popleft())
+
+    def pop(self):
+        """remove and return the newest action"""
+        entry = self.entries.pop()
+        self.__drop(entry)
+        return entry[0]
+
+    def peek(self):
+        """return the newest action without removing it, or None if empty"""
+        return self.entries[-1][0] if self.entries else None
+
+    def memory_used(self):
+        """approximate number of bytes taken up by our actions"""
+        return self.used
+
+    def __over_limits(self):
+        if self.max_entries and len(self.entries) > self.max_entries:
+            return True
+        return bool(self.max_bytes) and self.used > self.max_bytes
+
+    def __drop(self, entry):
+        """forget the memory accounting for an entry which was removed"""
+        action, size, blobs = entry
+        self.used -= size
+        for blob in blobs:
+            users = self.blob_users[blob] - 1
+            if users:
+                self.blob_users[blob] = users
+            else:
+                del self.blob_users[blob]
+                self.used -= sys.getsizeof(blob)
+
+            shared = self.blobs[blob]
+            shared[1] -= 1
+            if not shared[1]:
+                del self.blobs[blob]
+
+    def __share(self, obj, blobs, seen):
+        """swap long strings in obj for their shared copies
+
+        returns obj, or a copy of it if it is a tuple, along with its size in
+        bytes minus the shared strings. lists are changed in place. every
+        shared string used is added to blobs."""
+        if isinstance(obj, basestring):
+            if len(obj) < self.BLOB_SIZE:
+                return obj, sys.getsizeof(obj)
+            shared = self.blobs.get(obj)
+            if shared is None:
+                shared = self.blobs[obj] = [obj, 0]
+            shared[1] += 1
+            blobs.append(shared[0])
+            return shared[0], 0
+
+        if id(obj) in seen:
+            return obj, 0
+        seen.add(id(obj))
+
+        size = sys.getsizeof(obj)
+        if isinstance(obj, tuple):
+            items = []
+            for item in obj:
+                item, item_size = self.__share(item, blobs, seen)
+                items.append(item)
+                size += item_size
+            return tuple(items), size
+        if isinstance(obj, list):
+            for n, item in enumerate(obj):
+                obj[n], item_size = self.__share(item, blobs, seen)
+                size += item_size
+        return obj, size